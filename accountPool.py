@@ -0,0 +1,128 @@
+'''
+Pool of pre-created test accounts, so login tests of different workers never share an account and registrations
+never share an e-mail.
+
+The accounts are created once through the app and listed in creds.csv after its four cells, an e-mail and
+a password per row:
+
+    tester@example.com,password,tester.reg@example.com,regPassword
+    tester+pool1@example.com,pool1Password
+    tester+pool2@example.com,pool2Password
+
+They are never deleted. A test leases one of them for its duration - the lease is a lock file in
+user_data/accounts held by the test's process(see ProfileLock in profileStore.py), so xdist workers and
+asyncRunner.py running at the same time never hand one account to two tests. A crashed run's leases are
+stale and taken over. Without listed accounts the tests log in with the login account of creds.csv.
+
+Only tests that register ask for a registration e-mail: a fresh subaddress of the registration e-mail
+(name+reg.<namespace>.<n>@domain), mail sent to it still arrives in the test mailbox. The registered accounts
+are deleted in one cleanup when the session ends(see cleanupUtils.py). A pool with a RowTracker leaves that to
+the tracker: the e-mails are tracked as they are handed out, so a run that dies before its teardown still gets
+the accounts deleted.
+
+The suite doesn't use the pool while recording or replaying traffic(--har-mode): the recorded login and
+registration requests are matched by their body, so both runs type the e-mails of creds.csv.
+'''
+import os, re, threading, time, uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from cleanupUtils import CleanupPlan, OwnedRows, RowTracker, run_cleanup
+from nomadConfig import UserCredentials, load_pool_accounts, load_user_credentials
+from profileStore import ProfileLock, ProfileLockedError
+
+ACCOUNT_LOCK_DIR = 'user_data/accounts'
+LEASE_TIMEOUT = 60  # seconds a test waits for one of the accounts to be free
+LEASE_POLL = 0.5  # seconds between two rounds over the locks
+REGISTRATION_DEPENDENTS = (OwnedRows('tenant_language', 'tenant'),)  # deleted together with a registered tenant
+
+
+class AccountPoolError(RuntimeError):
+    '''Raised when none of the listed accounts gets free in time.'''
+
+
+@dataclass(frozen=True)
+class PooledAccount:
+    email: str
+    password: str
+
+
+def _subaddress(email: str, tag: str) -> str:
+    local, domain = email.split('@', 1)
+    return f"{local.split('+', 1)[0]}+{tag}@{domain}"
+
+
+class AccountPool:
+    '''
+    Accounts of creds.csv for the tests of one process. Thread safe, the database is only used by close()
+    and only if a test registered.
+
+    Args:
+        base (UserCredentials): accounts of creds.csv, registration e-mails are subaddresses of its registration e-mail.
+        accounts (list): (email, password) of the pre-created accounts, the ones listed in creds.csv by default.
+        namespace (str): part of every registration e-mail, unique per worker and run by default.
+        lockDir (str): directory of the leases' lock files.
+        tracker (RowTracker): tracks the registrations, so they're deleted by its teardown instead of close().
+    '''
+
+    def __init__(self, base: UserCredentials | None = None, accounts: list[tuple[str, str]] | None = None,
+                 namespace: str | None = None, lockDir: str = ACCOUNT_LOCK_DIR, tracker: RowTracker | None = None):
+        self.base = base or load_user_credentials()
+        self.accounts = [PooledAccount(*account) for account in (load_pool_accounts() if accounts is None else accounts)]
+        self.tracker = tracker
+        worker = os.environ.get('PYTEST_XDIST_WORKER', 'main')
+        self.namespace = namespace or (tracker.namespace if tracker else f'{worker}-{uuid.uuid4().hex[:6]}')
+        self.lockDir = Path(lockDir)
+        self.registrations: list[str] = []  # e-mails handed out for registration, deleted by close()
+        self._lock = threading.Lock()
+
+    def _lease_lock(self, account: PooledAccount) -> ProfileLock:
+        return ProfileLock(self.lockDir / re.sub(r'[^\w.@+-]', '_', account.email))
+
+    @contextmanager
+    def lease(self, timeout: float = LEASE_TIMEOUT):
+        '''Hands out an account no other test - of any process - uses at the same time.'''
+        if not self.accounts:
+            raise AccountPoolError('No pre-created accounts are listed in the creds file.')
+        deadline = time.monotonic() + timeout
+        while True:
+            for account in self.accounts:
+                lock = self._lease_lock(account)
+                try:
+                    lock.acquire(timeout=0)
+                except ProfileLockedError:
+                    continue
+                try:
+                    yield account
+                finally:
+                    lock.release()
+                return
+            if time.monotonic() > deadline:
+                raise AccountPoolError(f'All {len(self.accounts)} pooled accounts stayed leased for {timeout} s.')
+            time.sleep(LEASE_POLL)
+
+    def credentials(self, account: PooledAccount) -> UserCredentials:
+        '''Credentials of a test logging in with the account, the registration account stays the one of creds.csv.'''
+        return UserCredentials(account.email, account.password, self.base.registration_email,
+                               self.base.registration_password)
+
+    def registration_credentials(self) -> UserCredentials:
+        '''Credentials with a registration e-mail no other test uses, the account is deleted by close().'''
+        with self._lock:
+            email = _subaddress(self.base.registration_email, f'reg.{self.namespace}.{len(self.registrations) + 1}')
+            self.registrations.append(email)
+            if self.tracker is not None:
+                self.tracker.track_where('tenant', 'email = %s', (email,), REGISTRATION_DEPENDENTS)
+        return UserCredentials(self.base.email, self.base.password, email, self.base.registration_password)
+
+    def close(self) -> dict[str, int]:
+        '''Deletes the registered accounts in one transaction, returns deleted rows per table.
+        With a tracker nothing is deleted here, its teardown does it with the rest of the worker's rows.'''
+        with self._lock:
+            emails = tuple(self.registrations)
+            self.registrations.clear()
+        if not emails or self.tracker is not None:
+            return {}
+        placeholders = ', '.join(['%s'] * len(emails))
+        return run_cleanup(CleanupPlan('tenant', f'email IN ({placeholders})', emails,
+                                       dependents=REGISTRATION_DEPENDENTS))
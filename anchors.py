@@ -0,0 +1,260 @@
+'''
+Visual anchors for elements that have no usable locator, e.g. pins drawn by the Angular Google Maps API.
+
+An anchor is recorded once(getObjCoordinates.py with an anchor name, then Alt+click the element): its selector path,
+bounding box, the clicked point and a small image template around it go to anchors/index.json and anchors/<name>.png.
+At run time resolve_anchor() finds the point again - from the last hit for the same viewport size if the template
+still matches there, then by the selector path, then by template matching over a downscaled screenshot -
+and falls back to the recorded coordinates only if all of that fails.
+'''
+import io, json, logging, os, threading
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+from PIL import Image
+from playwright.sync_api import Page
+
+ANCHOR_DIR = Path('anchors')
+ANCHOR_INDEX = 'index.json'
+TEMPLATE_SIZE = 40  # css px around the clicked point saved as the template
+SEARCH_SCALE = 0.5  # screenshots and templates are downscaled by this for the search
+MIN_SCORE = 0.8  # normalized cross-correlation a match needs
+
+# JS collecting the fingerprint of an element(used by getObjCoordinates.py's logger)
+FINGERPRINT_JS = '''(element) => {
+    const path = [];
+    for (let node = element; node && node.nodeType === 1 && node !== document.body; node = node.parentElement) {
+        if (node.id) { path.unshift('#' + CSS.escape(node.id)); break; }
+        let part = node.localName;
+        const siblings = node.parentElement ? [...node.parentElement.children].filter(n => n.localName === node.localName) : [];
+        if (siblings.length > 1) part += `:nth-of-type(${siblings.indexOf(node) + 1})`;
+        path.unshift(part);
+    }
+    const rect = element.getBoundingClientRect();
+    return {selector: path.join(' > '), box: {x: rect.x, y: rect.y, width: rect.width, height: rect.height}};
+}'''
+
+
+@dataclass
+class Anchor:
+    name: str
+    selector: str
+    box: dict  # bounding box of the element when it was recorded
+    point: tuple[float, float]  # clicked point in the viewport
+    viewport: tuple[int, int]
+    template: str  # file name of the image template, centered on the point
+
+
+_lock = threading.Lock()  # guards the index file and _hits
+_hits: dict[tuple[str, int, int], tuple[float, float]] = {}  # (anchor, viewport width, height) -> last resolved point
+
+
+def load_index(anchorDir: Path = ANCHOR_DIR) -> dict[str, Anchor]:
+    '''Recorded anchors by name, the index is parsed again only when it changes.'''
+    path = Path(anchorDir) / ANCHOR_INDEX
+    try:
+        return _parse_index(path, path.stat().st_mtime_ns)
+    except (OSError, ValueError):
+        return {}
+
+
+@lru_cache(maxsize=8)
+def _parse_index(path: Path, mtime: int) -> dict[str, Anchor]:
+    data = json.loads(path.read_text())
+    return {name: Anchor(name=name, **{k: v for k, v in entry.items() if k != 'name'}) for name, entry in data.items()}
+
+
+@lru_cache(maxsize=64)
+def _load_template(path: Path, mtime: int) -> np.ndarray:
+    return _gray(path.read_bytes(), SEARCH_SCALE)
+
+
+def record_anchor(page: Page, name: str, x: float, y: float, fingerprint: dict | None = None,
+                  anchorDir: Path = ANCHOR_DIR) -> Anchor:
+    '''Saves the element at (x, y) as an anchor: fingerprint, template image and index entry.'''
+    if fingerprint is None:
+        fingerprint = page.evaluate(f'([x, y]) => ({FINGERPRINT_JS})(document.elementFromPoint(x, y))', [x, y])
+    viewport = page.viewport_size or page.evaluate('() => ({width: innerWidth, height: innerHeight})')
+    half = TEMPLATE_SIZE / 2
+    clip = {'x': max(x - half, 0), 'y': max(y - half, 0), 'width': TEMPLATE_SIZE, 'height': TEMPLATE_SIZE}
+    anchorDir = Path(anchorDir)
+    anchorDir.mkdir(parents=True, exist_ok=True)
+    page.screenshot(path=anchorDir / f'{name}.png', clip=clip, scale='css', animations='disabled')
+
+    anchor = Anchor(name, fingerprint['selector'], fingerprint['box'], (x, y),
+                    (viewport['width'], viewport['height']), f'{name}.png')
+    with _lock:
+        index = {key: asdict(value) for key, value in load_index(anchorDir).items()}
+        index[name] = asdict(anchor)
+        tmpPath = anchorDir / f'{ANCHOR_INDEX}.tmp'
+        tmpPath.write_text(json.dumps(index, indent=2, ensure_ascii=False))
+        os.replace(tmpPath, anchorDir / ANCHOR_INDEX)
+    return anchor
+
+
+def _gray(png: bytes, scale: float) -> np.ndarray:
+    image = Image.open(io.BytesIO(png)).convert('L')
+    if scale != 1:
+        image = image.resize((max(int(image.width * scale), 1), max(int(image.height * scale), 1)), Image.BILINEAR)
+    return np.asarray(image, dtype=np.float64)
+
+
+def _window_sums(values: np.ndarray, height: int, width: int) -> np.ndarray:
+    integral = np.pad(values, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+    return integral[height:, width:] - integral[:-height, width:] - integral[height:, :-width] + integral[:-height, :-width]
+
+
+def match_template(image: np.ndarray, template: np.ndarray) -> tuple[int, int, float]:
+    '''
+    Normalized cross-correlation of the template over the image, computed with FFTs.
+    Returns the top left corner of the best match and its score(-1 to 1).
+    '''
+    imageHeight, imageWidth = image.shape
+    height, width = template.shape
+    if height > imageHeight or width > imageWidth:
+        return 0, 0, -1.0
+    centered = template - template.mean()
+    templateNorm = np.sqrt((centered ** 2).sum())
+    if templateNorm == 0:
+        return 0, 0, -1.0  # a flat template matches everything equally
+
+    shape = (imageHeight + height - 1, imageWidth + width - 1)
+    correlation = np.fft.irfft2(np.fft.rfft2(image, shape) * np.fft.rfft2(centered[::-1, ::-1], shape), shape)
+    correlation = correlation[height - 1:imageHeight, width - 1:imageWidth]
+
+    sums = _window_sums(image, height, width)
+    variance = _window_sums(image ** 2, height, width) - sums ** 2 / (height * width)
+    scores = correlation / (np.sqrt(np.maximum(variance, 1e-9)) * templateNorm)
+    scores[variance < 1e-6] = -1.0  # flat regions of the screenshot
+    y, x = np.unravel_index(np.argmax(scores), scores.shape)
+    return int(x), int(y), float(scores[y, x])
+
+
+def _region_clip(point: tuple[float, float]) -> dict:
+    half = TEMPLATE_SIZE / 2
+    return {'x': max(point[0] - half - 4, 0), 'y': max(point[1] - half - 4, 0),
+            'width': TEMPLATE_SIZE + 8, 'height': TEMPLATE_SIZE + 8}
+
+
+def _point_in_box(anchor: Anchor, box: dict | None) -> tuple[float, float] | None:
+    if not box or not box['width'] or not box['height']:
+        return None
+    # same relative position inside the element as when it was recorded
+    relX = (anchor.point[0] - anchor.box['x']) / anchor.box['width'] if anchor.box['width'] else 0.5
+    relY = (anchor.point[1] - anchor.box['y']) / anchor.box['height'] if anchor.box['height'] else 0.5
+    return box['x'] + relX * box['width'], box['y'] + relY * box['height']
+
+
+def _match_point(screenshot: bytes, template: np.ndarray) -> tuple[float, float] | None:
+    x, y, score = match_template(_gray(screenshot, SEARCH_SCALE), template)
+    if score < MIN_SCORE:
+        logging.debug(f'ANCHOR: Best template match scored only {score:.2f}.')
+        return None
+    height, width = template.shape
+    return (x + width / 2) / SEARCH_SCALE, (y + height / 2) / SEARCH_SCALE
+
+
+def _lookup(page, name: str, anchorDir: Path) -> tuple[Anchor | None, tuple, np.ndarray | None]:
+    '''The anchor, its key in the hit cache and its template(None if the template file is gone).'''
+    anchor = load_index(anchorDir).get(name)
+    if anchor is None:
+        return None, (), None
+    viewport = page.viewport_size or {'width': 0, 'height': 0}
+    templatePath = Path(anchorDir) / anchor.template
+    template = _load_template(templatePath, templatePath.stat().st_mtime_ns) if templatePath.exists() else None
+    return anchor, (name, viewport['width'], viewport['height']), template
+
+
+def _not_recorded(name: str, fallback: tuple[float, float] | None) -> tuple[float, float]:
+    if fallback is None:
+        raise LookupError(f'Unknown anchor {name}, record it with getObjCoordinates.py.')
+    logging.debug(f'ANCHOR: {name} is not recorded, using {fallback}.')
+    return fallback
+
+
+def _resolved(name: str, key: tuple, point: tuple[float, float] | None, fallback, anchor: Anchor) -> tuple[float, float]:
+    if point is None:
+        point = fallback or anchor.point
+        logging.debug(f'ANCHOR: {name} not found on the page, using {point}.')
+        return point
+    with _lock:  # pages of one process may resolve anchors from several threads
+        _hits[key] = point
+    return point
+
+
+def _template_at(page: Page, template: np.ndarray, point: tuple[float, float]) -> bool:
+    '''Checks whether the template still matches around a point, screenshotting only that region.'''
+    try:
+        region = _gray(page.screenshot(clip=_region_clip(point), scale='css', animations='disabled'), SEARCH_SCALE)
+    except Exception:
+        return False
+    return match_template(region, template)[2] >= MIN_SCORE
+
+
+def _by_selector(page: Page, anchor: Anchor) -> tuple[float, float] | None:
+    locator = page.locator(anchor.selector)
+    if locator.count() != 1:
+        return None
+    return _point_in_box(anchor, locator.bounding_box())
+
+
+def resolve_anchor(page: Page, name: str, fallback: tuple[float, float] | None = None,
+                   anchorDir: Path = ANCHOR_DIR) -> tuple[float, float]:
+    '''
+    Returns the viewport point of the anchor. Raises LookupError if it can't be found and there is no fallback.
+    '''
+    anchor, key, template = _lookup(page, name, anchorDir)
+    if anchor is None:
+        return _not_recorded(name, fallback)
+
+    with _lock:
+        cached = _hits.get(key)
+    if cached is not None and template is not None and _template_at(page, template, cached):
+        return cached
+
+    point = _by_selector(page, anchor)
+    if point is not None and template is not None and not _template_at(page, template, point):
+        point = None  # the selector path now leads to another element, e.g. a different pin
+    if point is None and template is not None:
+        point = _match_point(page.screenshot(scale='css', animations='disabled'), template)
+    return _resolved(name, key, point, fallback, anchor)
+
+
+async def _template_at_async(page, template: np.ndarray, point: tuple[float, float]) -> bool:
+    try:
+        region = _gray(await page.screenshot(clip=_region_clip(point), scale='css', animations='disabled'), SEARCH_SCALE)
+    except Exception:
+        return False
+    return match_template(region, template)[2] >= MIN_SCORE
+
+
+async def resolve_anchor_async(page, name: str, fallback: tuple[float, float] | None = None,
+                               anchorDir: Path = ANCHOR_DIR) -> tuple[float, float]:
+    '''resolve_anchor() for pages of playwright.async_api(see asyncRunner.py).'''
+    anchor, key, template = _lookup(page, name, anchorDir)
+    if anchor is None:
+        return _not_recorded(name, fallback)
+
+    with _lock:
+        cached = _hits.get(key)
+    if cached is not None and template is not None and await _template_at_async(page, template, cached):
+        return cached
+
+    point = None
+    locator = page.locator(anchor.selector)
+    if await locator.count() == 1:
+        point = _point_in_box(anchor, await locator.bounding_box())
+    if point is not None and template is not None and not await _template_at_async(page, template, point):
+        point = None
+    if point is None and template is not None:
+        point = _match_point(await page.screenshot(scale='css', animations='disabled'), template)
+    return _resolved(name, key, point, fallback, anchor)
+
+
+def click_anchor(page: Page, name: str, fallback: tuple[float, float] | None = None) -> None:
+    page.mouse.click(*resolve_anchor(page, name, fallback))
+
+
+async def click_anchor_async(page, name: str, fallback: tuple[float, float] | None = None) -> None:
+    await page.mouse.click(*await resolve_anchor_async(page, name, fallback))
@@ -0,0 +1,86 @@
+import gzip, io, logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from PIL import Image
+from playwright.sync_api import Page, ConsoleMessage
+
+ARTIFACT_FORMATS = ('webp', 'jpeg', 'png')
+
+
+class ArtifactWriter:
+    '''
+    Captures failure artifacts - screenshot, DOM snapshot and console log - of a page.
+    Only the browser round trips happen on the test's thread, encoding, compression and disk writes
+    run in a background thread pool. Call flush() before the process ends.
+
+    Args:
+        outDir (str): directory the artifacts are saved to.
+        imageFormat (str): "webp", "jpeg" or "png".
+        quality (int): quality(1-100) of webp and jpeg screenshots.
+        scale (float): screenshots are downscaled by this factor, 1 keeps the original size.
+        threads (int): size of the background thread pool.
+    '''
+
+    def __init__(self, outDir: str = 'screenshots', imageFormat: str = 'webp', quality: int = 80,
+                 scale: float = 1.0, threads: int = 2):
+        if imageFormat not in ARTIFACT_FORMATS:
+            raise ValueError(f"Screenshot format must be one of {', '.join(ARTIFACT_FORMATS)}")
+        self.outDir = Path(outDir)
+        self.imageFormat = imageFormat
+        self.quality = quality
+        self.scale = scale
+        self.threads = threads
+        self._executor = None
+        self._futures = []
+
+    def capture(self, page: Page, name: str, consoleLog: list[str] | None = None) -> Path:
+        '''Grabs the artifacts and queues them for writing, returns the screenshot path they will have.'''
+        # raw PNG is the cheapest thing to get out of the browser, the real encoding happens later
+        screenshot = page.screenshot(type='png')
+        try:
+            dom = page.content()
+        except Exception as E:  # e.g. the page is navigating
+            dom = f'<!-- DOM snapshot failed: {E} -->'
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='artifacts')
+        base = self.outDir / name
+        self._futures.append(self._executor.submit(self._write, base, screenshot, dom, list(consoleLog or [])))
+        return base.with_name(f'{base.name}.{self.imageFormat}')
+
+    def _write(self, base: Path, screenshot: bytes, dom: str, consoleLog: list[str]) -> None:
+        base.parent.mkdir(parents=True, exist_ok=True)
+        image = Image.open(io.BytesIO(screenshot))
+        if self.scale != 1:
+            size = (max(int(image.width * self.scale), 1), max(int(image.height * self.scale), 1))
+            image = image.resize(size, Image.LANCZOS)
+        if self.imageFormat == 'jpeg':
+            image = image.convert('RGB')
+        options = {'optimize': True} if self.imageFormat == 'png' else {'quality': self.quality}
+        image.save(base.with_name(f'{base.name}.{self.imageFormat}'), self.imageFormat.upper(), **options)
+
+        with gzip.open(base.with_name(f'{base.name}.html.gz'), 'wt', encoding='utf-8') as domFile:
+            domFile.write(dom)
+        if consoleLog:
+            base.with_name(f'{base.name}.console.log').write_text('\n'.join(consoleLog), encoding='utf-8')
+
+    def flush(self) -> None:
+        '''Waits until all queued artifacts are written, reporting the ones that failed.'''
+        for future in self._futures:
+            try:
+                future.result()
+            except Exception as E:
+                logging.error(f'Could not save failure artifacts: {E}')
+        self._futures.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def collect_console(page: Page, consoleLog: list[str]) -> None:
+    '''Appends the page's console messages and uncaught errors to consoleLog.'''
+    def on_console(message: ConsoleMessage) -> None:
+        consoleLog.append(f'[{message.type}] {message.text}')
+
+    page.on('console', on_console)
+    page.on('pageerror', lambda error: consoleLog.append(f'[pageerror] {error}'))
@@ -0,0 +1,275 @@
+'''
+Async runner: plays several flows at once in one browser, each in its own context, with playwright.async_api.
+A flow spends most of its time waiting for the network and rendering, so one process driving a few pages keeps
+a core busy where the sync suite needs a process(and a browser) per test.
+
+    python asyncRunner.py --concurrency 4                       # manualLogin and every scenario
+    python asyncRunner.py manualLogin vietnam vietnam --browser firefox
+
+Flows are the ones of nomadTests.py: manualLogin, registration(not in the default set, it registers the one
+e-mail of creds.csv) and every scenario of scenarios/ - played from the same step plans as the sync suite
+(see flowPlans.py and scenarioEngine.py), run_plan_async() is the only async code of a flow. Every review gets
+a summary of its own, the reviews are deleted when the run ends(see RowTracker in cleanupUtils.py).
+Results and step timings go to reports/async_run.json, a flow that fails before it starts is a failed result too.
+'''
+import argparse, asyncio, inspect, json, logging, os, sys, time
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from playwright.async_api import async_playwright, Browser, Page
+from anchors import click_anchor_async
+from cleanupUtils import CleanupJob, CleanupPlan, OwnedRows, RowTracker, format_deleted
+from dbUtils import get_pool
+from locators import locators_for
+from loginUtils import HOMEPAGE, auth_state_path, is_auth_state_valid
+from nomadTests import REVIEW_DEPENDENTS, NomadTestEnv
+from replayUtils import har_mode
+from flowPlans import LOGIN_PLAN, LOGOUT_PLAN, MANUAL_LOGIN_PLAN, REGISTRATION_PLAN
+from scenarioEngine import MAP, ScenarioError, PlanStep, list_scenarios, load_scenario, scenario_plan, step_value
+from stepTimer import REPORT_DIR, StepRecorder, summarize
+from waitUtils import DEFAULT_TIMEOUT, NAVIGATION_TIMEOUT, ANGULAR_STABLE_JS, ELEMENT_STABLE_JS, StepTimeouts
+
+DEFAULT_CONCURRENCY = 4  # pages driven at the same time
+ASYNC_REPORT = 'async_run'
+
+
+@dataclass
+class FlowResult:
+    flow: str
+    passed: bool
+    wall_ms: float
+    error: str | None = None
+    timings: list = field(default_factory=list)
+
+
+async def _wait_map(page: Page, timeout: int) -> None:
+    await page.wait_for_function(ANGULAR_STABLE_JS, timeout=timeout)
+    googleMap = page.locator(MAP).first
+    if await googleMap.count():
+        await googleMap.wait_for(state='visible', timeout=timeout)
+        handle = await googleMap.element_handle(timeout=timeout)
+        try:
+            await page.evaluate(ELEMENT_STABLE_JS, [handle, 2, timeout])
+        finally:
+            await handle.dispose()
+
+
+async def run_plan_async(page: Page, plan: tuple[PlanStep, ...], recorder: StepRecorder | None = None,
+                         hooks: dict | None = None, timeout: int = DEFAULT_TIMEOUT, params: dict | None = None) -> None:
+    '''run_plan() of scenarioEngine.py for async pages. Locators are built the same way, only the actions are awaited.'''
+    hooks = hooks or {}
+    locators = locators_for(page)
+    for step in plan:
+        if recorder is not None:
+            recorder.mark(step.name)
+        if step.action == 'goto':
+            await page.goto(str(step_value(step, params)))
+        elif step.action == 'click':
+            await locators.get(step.target).click()
+        elif step.action == 'fill':
+            await locators.get(step.target).fill(str(step_value(step, params)))
+        elif step.action == 'mouse_click':
+            await page.mouse.click(*step.value)
+        elif step.action == 'anchor_click':
+            await click_anchor_async(page, *step.value)
+        elif step.action == 'wait_map':
+            await _wait_map(page, timeout)
+        elif step.action == 'hook':
+            if step.value in hooks:
+                result = hooks[step.value]()
+                if inspect.isawaitable(result):
+                    await result
+        else:
+            raise ScenarioError(f'Unknown action {step.action}')
+
+
+async def ensure_logged_in_async(page: Page, credentials: tuple[str, str]) -> bool:
+    '''ensure_logged_in() for async pages. Returns True if the login form had to be used.'''
+    if not page.url.startswith(HOMEPAGE):
+        await page.goto(HOMEPAGE)
+    loginButton = locators_for(page).get('login.manual')
+    logoutButton = locators_for(page).get('logout')
+    await loginButton.or_(logoutButton).first.wait_for(state='attached')
+    if await logoutButton.count() > 0:
+        return False
+    await run_plan_async(page, LOGIN_PLAN, params={'email': credentials[0], 'password': credentials[1]})
+    await logoutButton.wait_for(state='attached')
+    return True
+
+
+def _tenant_exists(email: str) -> bool:
+    db = get_pool().acquire()
+    cursor = db.cursor()
+    try:
+        cursor.execute('SELECT email FROM tenant WHERE email = %s;', (email,))
+        return len(cursor.fetchall()) > 0
+    finally:
+        cursor.close()
+        db.close()
+
+
+class AsyncRunner:
+    '''
+    Runs flows concurrently in one browser, at most `concurrency` of them at a time, every flow in a fresh context.
+    Flows that need a session start from the storage state of the sync suite(user_data/auth), logged in once
+    if it's missing or expired. Each flow's steps get their timeouts from the same step history as the sync suite.
+    '''
+
+    def __init__(self, browser: str = 'chromium', concurrency: int = DEFAULT_CONCURRENCY, headless: bool = True,
+                 contextArgs: dict | None = None):
+        self.browserName = browser
+        self.concurrency = concurrency
+        self.headless = headless
+        self.contextArgs = contextArgs or {}
+        self.stepTimeouts = StepTimeouts.load(har_mode())
+        self.env = NomadTestEnv()
+        # reviews of concurrent flows get summaries of their own, deleted together when the run ends
+        self.tracker = None if har_mode() != 'off' else RowTracker()
+        self._authLock = asyncio.Lock()
+
+    @property
+    def credentials(self) -> tuple[str, str]:
+        return self.env.email1, self.env.pwd1
+
+    async def _auth_state(self, browser: Browser) -> Path:
+        '''The saved session, refreshed by one flow while the others wait for it.'''
+        statePath = auth_state_path(self.browserName)
+        async with self._authLock:
+            if is_auth_state_valid(statePath):
+                return statePath
+            context = await browser.new_context(**self.contextArgs)
+            try:
+                page = await context.new_page()
+                await ensure_logged_in_async(page, self.credentials)
+                statePath.parent.mkdir(parents=True, exist_ok=True)
+                tmpPath = statePath.with_suffix('.tmp')
+                await context.storage_state(path=tmpPath)
+                os.replace(tmpPath, statePath)
+            finally:
+                await context.close()
+        return statePath
+
+    async def manual_login(self, page: Page, recorder: StepRecorder) -> None:
+        await run_plan_async(page, MANUAL_LOGIN_PLAN + LOGOUT_PLAN, recorder,
+                             params={'url': self.env.homepage, 'email': self.env.email1, 'password': self.env.pwd1})
+        await page.wait_for_url(self.env.homepage + '**', timeout=NAVIGATION_TIMEOUT)
+
+    async def registration(self, page: Page, recorder: StepRecorder) -> None:
+        email, password = self.env.email2, self.env.pwd2
+        hooks = {}
+        if not self.env.offline:
+            recorder.mark('REGISTRATION: Clean up from previous tests.')
+            cleanup = CleanupJob(CleanupPlan('tenant', 'email = %s', (email,),
+                                             dependents=(OwnedRows('tenant_language', 'tenant'),)))
+
+            async def wait_for_cleanup() -> None:
+                # the old account has to be gone before registering the same e-mail again, the other pages go on meanwhile
+                deleted = await asyncio.to_thread(cleanup.wait)
+                logging.info(f'REGISTRATION: ALL CLEAN! ({format_deleted(deleted)})')
+            hooks['before_submit'] = wait_for_cleanup
+
+        await run_plan_async(page, REGISTRATION_PLAN, recorder, hooks, self.stepTimeouts.default,
+                             {'url': self.env.homepage, 'email': email, 'username': self.env.testUsername,
+                              'password': password})
+        if not self.env.offline:
+            # the check runs in a thread, a query must not block the other pages
+            created = await asyncio.to_thread(_tenant_exists, email)
+            assert created, f'User {email} should be created in database.'
+
+    async def play_scenario(self, page: Page, name: str, recorder: StepRecorder, number: int = 0) -> None:
+        scenario = load_scenario(name)
+        hooks, params = {}, {}
+        if scenario.review is not None and self.tracker is not None:
+            summary = f"{scenario.review['description']} [{self.tracker.namespace}.{number}]"
+            params['review_description'] = summary
+            # the ledger is written in a thread, the other pages go on meanwhile
+            hooks['before_submit'] = lambda: asyncio.to_thread(self.tracker.track_where, 'review', 'summary = %s',
+                                                               (summary,), REVIEW_DEPENDENTS)
+
+        recorder.mark(f'{scenario.label}: Log in unless already authenticated.')
+        await ensure_logged_in_async(page, self.credentials)
+        await run_plan_async(page, scenario_plan(name), recorder, hooks, self.stepTimeouts.default, params)
+
+    async def _run_flow(self, browser: Browser, semaphore: asyncio.Semaphore, flow: str, number: int) -> FlowResult:
+        async with semaphore:
+            started = time.perf_counter()
+            context = recorder = None
+            try: # a flow whose login or context fails is a failed result, the other flows go on
+                needsAuth = flow not in ('manualLogin', 'registration')
+                storageState = await self._auth_state(browser) if needsAuth else None
+                context = await browser.new_context(**self.contextArgs, storage_state=storageState)
+                page = await context.new_page()
+                page.set_default_timeout(self.stepTimeouts.default)
+                page.set_default_navigation_timeout(NAVIGATION_TIMEOUT)
+                # the timeout is set per page, so concurrent flows don't change each other's
+                recorder = StepRecorder(f'async::{flow}[{number}]',
+                                        onStep=lambda step: page.set_default_timeout(self.stepTimeouts.for_step(step)))
+                recorder.attach(page)
+                if flow == 'manualLogin':
+                    await self.manual_login(page, recorder)
+                elif flow == 'registration':
+                    await self.registration(page, recorder)
+                else:
+                    await self.play_scenario(page, flow, recorder, number)
+                error = None
+            except Exception as E:
+                logging.error(f'ASYNC RUNNER: {flow} failed: {E}')
+                error = str(E).splitlines()[0] if str(E) else repr(E)
+            finally:
+                if recorder is not None:
+                    recorder.finish()
+                if context is not None:
+                    await context.close()
+            return FlowResult(flow, error is None, round((time.perf_counter() - started) * 1000, 1), error,
+                              [asdict(timing) for timing in recorder.timings] if recorder is not None else [])
+
+    async def run(self, flows: list[str]) -> list[FlowResult]:
+        '''Runs the flows, at most `concurrency` at a time, and returns their results in the given order.'''
+        semaphore = asyncio.Semaphore(self.concurrency)
+        async with async_playwright() as p:
+            browser = await getattr(p, self.browserName).launch(headless=self.headless)
+            try:
+                results = await asyncio.gather(*(self._run_flow(browser, semaphore, flow, number)
+                                                 for number, flow in enumerate(flows)), return_exceptions=True)
+                # e.g. a context that failed to close, the other flows still get their results and the report
+                return [result if isinstance(result, FlowResult) else FlowResult(flow, False, 0.0, repr(result))
+                        for flow, result in zip(flows, results)]
+            finally:
+                await browser.close()
+                self.env.close()
+                if self.tracker is not None:
+                    deleted = await asyncio.to_thread(self.tracker.teardown)
+                    logging.info(f'ASYNC RUNNER: Deleted {format_deleted(deleted)}')
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('flows', nargs='*', help='manualLogin, registration or a scenario name')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--browser', choices=('chromium', 'firefox', 'webkit'), default='chromium')
+    parser.add_argument('--headed', action='store_true')
+    args = parser.parse_args()
+    flows = args.flows or ['manualLogin', *list_scenarios()]
+    known = {'manualLogin', 'registration', *list_scenarios()}
+    if not set(flows) <= known:
+        parser.error(f"Unknown flows {', '.join(sorted(set(flows) - known))}")
+
+    started = time.perf_counter()
+    results = asyncio.run(AsyncRunner(args.browser, args.concurrency, not args.headed).run(flows))
+    wall = (time.perf_counter() - started) * 1000
+
+    for result in results:
+        print(f"{'PASSED' if result.passed else 'FAILED'} {result.flow:<20} {result.wall_ms / 1000:>6.1f} s"
+              + (f'  {result.error}' if result.error else ''))
+    print(f'{len(flows)} flows, concurrency {args.concurrency}: {wall / 1000:.1f} s')
+
+    reportPath = Path(REPORT_DIR) / f'{ASYNC_REPORT}.json'
+    reportPath.parent.mkdir(parents=True, exist_ok=True)
+    timings = [timing for result in results for timing in result.timings]
+    reportPath.write_text(json.dumps({'wall_ms': round(wall, 1), 'concurrency': args.concurrency,
+                                      'browser': args.browser, 'flows': [asdict(result) for result in results],
+                                      'summary': summarize(timings)}, indent=2, ensure_ascii=False))
+    return 0 if all(result.passed for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+'''
+Benchmark of the end-to-end flows. Runs the suite N times against the recorded app(--har-mode=replay, so the
+network and the real backend don't add noise), records p50/p95 of the whole suite, of every flow and every step,
+appends them to benchmarks/history.json and fails if the suite or a flow got slower than the baseline allows.
+
+    python benchmark.py --runs 5 --threshold 0.15
+
+Record the traffic first with 'pytest --har-mode=record'.
+'''
+import argparse, json, os, subprocess, sys, time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from pathlib import Path
+from stepTimer import REPORT_DIR, STEP_REPORT, percentile
+
+HISTORY_PATH = Path('benchmarks/history.json')
+HISTORY_VERSION = 1  # bump when the layout of an entry changes, older entries are then ignored as baselines
+DEFAULT_THRESHOLD = 0.15  # allowed slowdown of p50 against the baseline, 0.15 = 15 %
+BENCHMARK_TESTS = ['test_nomad_main.py']  # manualLogin, registration and every scenario(playthroughFromMap, playthroughByArea, ...)
+
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(['git', *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def run_suite(tests: list[str], mode: str, browser: str, workers: str, extra: list[str]) -> dict:
+    '''Runs pytest once, returns the suite's wall time, the duration of every test and the step timings.'''
+    junitPath = Path(REPORT_DIR) / 'benchmark_junit.xml'
+    command = [sys.executable, '-m', 'pytest', *tests,
+               '-o', 'addopts=', '-q',  # pytest.ini runs headed, a benchmark shouldn't
+               '-n', workers, f'--har-mode={mode}', f'--browser={browser}',
+               f'--junitxml={junitPath}', '--step-report-top=0', *extra]
+    junitPath.unlink(missing_ok=True)
+    started = time.perf_counter()
+    result = subprocess.run(command, capture_output=True, text=True)
+    wall = (time.perf_counter() - started) * 1000
+    if not junitPath.exists():
+        raise RuntimeError(f'pytest did not run(exit code {result.returncode}):\n{result.stdout[-2000:]}{result.stderr[-2000:]}')
+
+    failed, tests = [], {}
+    for case in ET.parse(junitPath).getroot().iter('testcase'):
+        name = case.get('name')
+        if case.find('failure') is not None or case.find('error') is not None:
+            failed.append(name)
+        elif case.find('skipped') is None:
+            tests[name] = float(case.get('time', 0)) * 1000
+    if result.returncode != 0 or failed:
+        raise RuntimeError(f"Benchmark run failed({', '.join(failed) or f'exit code {result.returncode}'}):\n"
+                           f'{result.stdout[-2000:]}{result.stderr[-2000:]}')
+
+    stepReport = json.loads((Path(REPORT_DIR) / f'{STEP_REPORT}.json').read_text())
+    return {'wall_ms': wall, 'tests': tests, 'steps': stepReport['steps']}
+
+
+def _stats(values: list[float]) -> dict:
+    return {'p50_ms': round(percentile(values, 50), 1), 'p95_ms': round(percentile(values, 95), 1), 'n': len(values)}
+
+
+def aggregate(runs: list[dict]) -> dict:
+    '''p50/p95 of the suite, of every flow(test) and of every step over all runs.'''
+    flows, steps = {}, {}
+    for run in runs:
+        for name, duration in run['tests'].items():
+            flows.setdefault(name, []).append(duration)
+        for timing in run['steps']:
+            steps.setdefault(timing['step'], []).append(timing['wall_ms'])
+    return {'suite': _stats([run['wall_ms'] for run in runs]),
+            'flows': {name: _stats(values) for name, values in sorted(flows.items())},
+            'steps': {name: _stats(values) for name, values in sorted(steps.items())}}
+
+
+def load_history(path: Path = HISTORY_PATH) -> dict:
+    try:
+        history = json.loads(path.read_text())
+    except (OSError, ValueError):
+        history = {}
+    history.setdefault('version', HISTORY_VERSION)
+    history.setdefault('entries', [])
+    return history
+
+
+def find_baseline(history: dict, mode: str, browser: str) -> dict | None:
+    '''The latest entry of the same setup that didn't regress itself(or was accepted with --update-baseline).'''
+    for entry in reversed(history['entries']):
+        if (entry.get('version') == HISTORY_VERSION and entry['mode'] == mode and entry['browser'] == browser
+                and (not entry.get('regressions') or entry.get('accepted'))):
+            return entry
+    return None
+
+
+def find_regressions(results: dict, baseline: dict | None, threshold: float, gateSteps: bool = False) -> list[str]:
+    '''Everything whose p50 got slower than threshold allows, compared to the baseline.'''
+    if baseline is None:
+        return []
+    regressions = []
+
+    def compare(label: str, current: dict, previous: dict | None) -> None:
+        if previous and current['p50_ms'] > previous['p50_ms'] * (1 + threshold):
+            change = current['p50_ms'] / previous['p50_ms'] - 1 if previous['p50_ms'] else float('inf')
+            regressions.append(f"{label}: p50 {previous['p50_ms']:.0f} -> {current['p50_ms']:.0f} ms(+{change:.0%})")
+
+    compare('suite', results['suite'], baseline['results']['suite'])
+    for name, stats in results['flows'].items():
+        compare(name, stats, baseline['results']['flows'].get(name))
+    if gateSteps:
+        for name, stats in results['steps'].items():
+            compare(name, stats, baseline['results']['steps'].get(name))
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='measured runs')
+    parser.add_argument('--warmup', type=int, default=1, help='runs before measuring(caches, browser binaries)')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='allowed p50 slowdown, 0.15 = 15 %%')
+    parser.add_argument('--mode', choices=('replay', 'off'), default='replay', help="'off' benchmarks against the live app")
+    parser.add_argument('--browser', default='chromium')
+    parser.add_argument('--workers', default='auto', help='xdist workers, 0 runs the tests one by one')
+    parser.add_argument('--gate-steps', action='store_true', help='fail on regressions of single steps too')
+    parser.add_argument('--no-save', action='store_true', help="don't append the results to the history")
+    parser.add_argument('--update-baseline', action='store_true', help='save the results even if they regressed')
+    parser.add_argument('tests', nargs='*', default=BENCHMARK_TESTS)
+    args, extra = parser.parse_known_args()
+
+    for i in range(args.warmup):
+        print(f'Warm-up run {i + 1}/{args.warmup}')
+        run_suite(args.tests, args.mode, args.browser, args.workers, extra)
+    runs = []
+    for i in range(args.runs):
+        runs.append(run_suite(args.tests, args.mode, args.browser, args.workers, extra))
+        print(f"Run {i + 1}/{args.runs}: {runs[-1]['wall_ms'] / 1000:.1f} s")
+
+    results = aggregate(runs)
+    history = load_history()
+    baseline = find_baseline(history, args.mode, args.browser)
+    regressions = find_regressions(results, baseline, args.threshold, args.gate_steps)
+
+    print(f"\nsuite  p50 {results['suite']['p50_ms']:>8.0f} ms  p95 {results['suite']['p95_ms']:>8.0f} ms")
+    for name, stats in results['flows'].items():
+        print(f"{name:<30} p50 {stats['p50_ms']:>8.0f} ms  p95 {stats['p95_ms']:>8.0f} ms")
+    if baseline is None:
+        print('No baseline yet, these results become it.')
+    else:
+        print(f"Baseline: {baseline['commit'][:10]} from {baseline['timestamp']}")
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+
+    if not args.no_save and (not regressions or args.update_baseline):
+        history['entries'].append({
+            'version': HISTORY_VERSION,
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': _git('rev-parse', 'HEAD'),
+            'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+            'mode': args.mode, 'browser': args.browser, 'workers': args.workers, 'runs': args.runs,
+            'threshold': args.threshold, 'regressions': regressions, 'accepted': args.update_baseline,
+            'results': results,
+        })
+        HISTORY_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmpPath = HISTORY_PATH.with_suffix('.tmp')
+        tmpPath.write_text(json.dumps(history, indent=2, ensure_ascii=False))
+        os.replace(tmpPath, HISTORY_PATH)
+        print(f'Results saved to {HISTORY_PATH}')
+    return 1 if regressions and not args.update_baseline else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
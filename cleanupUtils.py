@@ -0,0 +1,237 @@
+import json, logging, os, threading, time, uuid
+from dataclasses import dataclass
+from pathlib import Path
+from dbUtils import get_pool
+
+CLEANUP_CHUNK_SIZE = 500  # max ids per IN list when a plan deletes explicit ids
+
+
+@dataclass(frozen=True)
+class OwnedRows:
+    '''Rows of a dependent table, owned through the column that references the plan's root rows.'''
+    table: str
+    key: str
+
+
+@dataclass(frozen=True)
+class CleanupPlan:
+    '''
+    Declares the rows a test owns.
+
+    Args:
+        table (str): root table, e.g. "tenant".
+        where (str): condition selecting the root rows, e.g. "email = %s". Ignored if ids are given.
+        params (tuple): parameters of the where condition.
+        dependents (tuple): OwnedRows referencing the root rows, in the order they have to be deleted in.
+        key (str): primary key of the root table.
+        ids (tuple): explicit root ids, deleted in chunks of CLEANUP_CHUNK_SIZE.
+    '''
+    table: str
+    where: str = ''
+    params: tuple = ()
+    dependents: tuple[OwnedRows, ...] = ()
+    key: str = 'id'
+    ids: tuple = ()
+
+    def statements(self) -> list[tuple[str, str, tuple]]:
+        '''Returns (table, sql, params) of every DELETE, children before their parents.'''
+        if self.ids:
+            conditions = []
+            for start in range(0, len(self.ids), CLEANUP_CHUNK_SIZE):
+                chunk = tuple(self.ids[start:start + CLEANUP_CHUNK_SIZE])
+                placeholders = ', '.join(['%s'] * len(chunk))
+                conditions.append((f'IN ({placeholders})', chunk))
+        else:
+            # the subquery lets the server find the ids itself - no SELECT round trip, no matter how many rows match
+            conditions = [(f'IN (SELECT {self.key} FROM {self.table} WHERE {self.where})', tuple(self.params))]
+
+        statements = []
+        for condition, params in conditions:
+            for dependent in self.dependents:
+                statements.append((dependent.table, f'DELETE FROM {dependent.table} WHERE {dependent.key} {condition}', params))
+            if self.ids:
+                statements.append((self.table, f'DELETE FROM {self.table} WHERE {self.key} {condition}', params))
+            else:
+                statements.append((self.table, f'DELETE FROM {self.table} WHERE {self.where}', params))
+        return statements
+
+
+def run_cleanup(*plans: CleanupPlan) -> dict[str, int]:
+    '''
+    Deletes the rows of all plans in one transaction and one round trip(plus the commit).
+    Returns the number of deleted rows per table.
+    '''
+    statements = [statement for plan in plans for statement in plan.statements()]
+    deleted = {table: 0 for table, sql, params in statements}
+    if not statements:
+        return deleted
+
+    db = get_pool().acquire()
+    cursor = db.cursor()
+    try:
+        sql = ';\n'.join(sql for table, sql, params in statements)
+        params = tuple(param for table, sql, stmtParams in statements for param in stmtParams)
+        results = cursor.execute(sql, params, multi=True)
+        for (table, _, _), result in zip(statements, results):
+            deleted[table] += max(result.rowcount, 0)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cursor.close()
+        db.close()
+    return deleted
+
+
+class CleanupJob:
+    '''Runs cleanup plans in a background thread, so they overlap with opening the app in the browser.'''
+
+    def __init__(self, *plans: CleanupPlan):
+        self.plans = plans
+        self.deleted = None
+        self.error = None
+        self._thread = threading.Thread(target=self._run, name='cleanup', daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            self.deleted = run_cleanup(*self.plans)
+        except Exception as E:
+            self.error = E
+
+    def wait(self, timeout: float | None = None) -> dict[str, int]:
+        '''Waits for the cleanup to finish, re-raises its error and returns deleted rows per table.'''
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            raise TimeoutError(f'Cleanup did not finish within {timeout} s.')
+        if self.error is not None:
+            raise self.error
+        return self.deleted
+
+
+def format_deleted(deleted: dict[str, int]) -> str:
+    '''Formats row counts for logs, e.g. "tenant_language: 2, tenant: 1".'''
+    return ', '.join(f'{table}: {count}' for table, count in deleted.items()) or 'nothing to delete'
+
+
+LEDGER_DIR = 'reports/cleanup'  # what every worker created and didn't delete yet, one file per worker and run
+RUN_ID_ENV = 'NOMAD_RUN_ID'  # set by the controller, so all workers of a run share it
+LEDGER_STALE_AGE = 12 * 60 * 60  # seconds, on Windows a ledger is only swept when it wasn't written to for so long
+
+
+def run_id() -> str:
+    '''Id of the current run, the same in every xdist worker. A process outside of pytest gets its own.'''
+    if RUN_ID_ENV not in os.environ:
+        os.environ[RUN_ID_ENV] = time.strftime('%y%m%d%H%M%S') + uuid.uuid4().hex[:4]
+    return os.environ[RUN_ID_ENV]
+
+
+def _plan_to_json(plan: CleanupPlan) -> dict:
+    return {'table': plan.table, 'where': plan.where, 'params': list(plan.params), 'key': plan.key,
+            'ids': list(plan.ids), 'dependents': [[dependent.table, dependent.key] for dependent in plan.dependents]}
+
+
+def _plan_from_json(data: dict) -> CleanupPlan:
+    return CleanupPlan(data['table'], data.get('where', ''), tuple(data.get('params', ())),
+                       tuple(OwnedRows(table, key) for table, key in data.get('dependents', ())),
+                       data.get('key', 'id'), tuple(data.get('ids', ())))
+
+
+def merge_plans(plans: list[CleanupPlan]) -> list[CleanupPlan]:
+    '''Merges id plans of the same table(and dependents) into one, so their rows go in as few DELETEs as possible.
+    The merged id plans come first, then the condition plans in their order.'''
+    merged: dict[tuple, list] = {}
+    others = []
+    for plan in plans:
+        if plan.ids:
+            merged.setdefault((plan.table, plan.key, plan.dependents), []).extend(plan.ids)
+        else:
+            others.append(plan)
+    result = [CleanupPlan(table, dependents=dependents, key=key, ids=tuple(dict.fromkeys(ids)))
+              for (table, key, dependents), ids in merged.items()]
+    return result + others
+
+
+class RowTracker:
+    '''
+    Rows one worker created during a run, so they can be deleted by id instead of searched for.
+    Everything tracked is also appended to a ledger file(LEDGER_DIR/<namespace>.jsonl) right away: if the run dies
+    before teardown(), sweep_ledgers() at the start of the next session deletes the rows.
+    The namespace(run id + worker) is meant to go into the unique values the rows are created with,
+    e.g. the summary of a review, so a test can find what it created itself.
+    '''
+
+    def __init__(self, namespace: str | None = None, ledgerDir: str = LEDGER_DIR):
+        worker = os.environ.get('PYTEST_XDIST_WORKER', 'main')
+        self.namespace = namespace or f'{run_id()}-{worker}'
+        self.ledger = Path(ledgerDir) / f'{self.namespace}.jsonl'
+        self.plans: list[CleanupPlan] = []
+        self._lock = threading.Lock()
+
+    def _add(self, plan: CleanupPlan) -> None:
+        with self._lock:
+            self.plans.append(plan)
+            self.ledger.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.ledger, 'a') as ledger:
+                ledger.write(json.dumps({'pid': os.getpid(), **_plan_to_json(plan)}) + '\n')
+
+    def track(self, table: str, ids, dependents: tuple[OwnedRows, ...] = (), key: str = 'id') -> None:
+        '''Tracks rows by their ids.'''
+        ids = tuple(ids)
+        if ids:
+            self._add(CleanupPlan(table, dependents=tuple(dependents), key=key, ids=ids))
+
+    def track_where(self, table: str, where: str, params: tuple = (), dependents: tuple[OwnedRows, ...] = (),
+                    key: str = 'id') -> None:
+        '''Tracks rows whose ids aren't known yet, e.g. an account the app is about to register.
+        The condition has to select only rows of this namespace.'''
+        self._add(CleanupPlan(table, where, tuple(params), tuple(dependents), key))
+
+    def teardown(self) -> dict[str, int]:
+        '''Deletes everything tracked in one transaction and removes the ledger.'''
+        with self._lock:
+            plans, self.plans = merge_plans(self.plans), []
+        deleted = run_cleanup(*plans) if plans else {}
+        self.ledger.unlink(missing_ok=True)
+        return deleted
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (OSError, ValueError):
+        return True
+    return True
+
+
+def sweep_ledgers(ledgerDir: str = LEDGER_DIR) -> dict[str, int]:
+    '''
+    Deletes the rows of ledgers earlier runs left behind(a crash, a killed worker) in one transaction.
+    Ledgers of processes that are still running - another session on this machine - are left alone.
+    Windows has no signal-free check whether a pid is alive(os.kill() would terminate it), so there a ledger is
+    only swept once it hasn't been written to for LEDGER_STALE_AGE - a live session writing no rows for that long
+    would lose its rows.
+    '''
+    paths, plans = [], []
+    for path in sorted(Path(ledgerDir).glob('*.jsonl')):
+        try:
+            entries = [json.loads(line) for line in path.read_text().splitlines() if line.strip()]
+        except (OSError, ValueError) as E:
+            logging.debug(f'CLEANUP: Skipping unreadable ledger {path}: {E}')
+            continue
+        if os.name == 'nt':
+            if time.time() - path.stat().st_mtime < LEDGER_STALE_AGE:
+                continue
+        elif any(_pid_alive(entry.get('pid', 0)) for entry in entries):
+            continue
+        paths.append(path)
+        plans += [_plan_from_json(entry) for entry in entries]
+    deleted = run_cleanup(*merge_plans(plans)) if plans else {}
+    for path in paths:
+        path.unlink(missing_ok=True)
+    return deleted
@@ -1,4 +1,213 @@
-import sys, os, shutil
+import sys, os, re, json, time, bisect, argparse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+RUN_LEDGER = os.path.join('logs', '.runs.jsonl')  # start time and failed tests of every test run, see conftest.py
+PROTECTED = {'readme.txt'}  # placeholders kept in git, never deleted
+UNLINK_THREADS = 8
+LOG_NAME = re.compile(r'^(?P<test>.+)_\d{2}-\d{2}-\d{2}-\d{6}\.log$')  # logs/<test name>_<H-M-S-f>.log
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    '''
+    What survives a prune. A file is deleted if any of the rules says so, max_bytes is applied last
+    and deletes the oldest of the remaining files until the rest fits.
+
+    Args:
+        keep_runs (int): keep artifacts of the last N test runs.
+        max_age_days (float): delete artifacts older than this.
+        max_bytes (int): total size all pruned directories may take up.
+        keep_failures_only (bool): delete logs of tests that passed, screenshots are only taken of failures anyway.
+    '''
+    keep_runs: int | None = None
+    max_age_days: float | None = None
+    max_bytes: int | None = None
+    keep_failures_only: bool = False
+
+
+@dataclass
+class Artifact:
+    path: str
+    size: int
+    mtime: float
+    run: int = -1  # index into the run ledger, -1 for files older than the first recorded run
+
+
+@dataclass
+class PruneReport:
+    '''What a prune deleted(or would delete on a dry run) and why.'''
+    dry_run: bool
+    kept: int = 0
+    kept_bytes: int = 0
+    deleted: dict = field(default_factory=dict)  # reason -> [count, bytes]
+    errors: list = field(default_factory=list)
+    paths: list = field(default_factory=list)
+
+    def add(self, artifact: Artifact, reason: str) -> None:
+        counts = self.deleted.setdefault(reason, [0, 0])
+        counts[0] += 1
+        counts[1] += artifact.size
+        self.paths.append(artifact.path)
+
+    def format(self, verbose: bool = False) -> str:
+        verb = 'Would delete' if self.dry_run else 'Deleted'
+        lines = [f'  {path}' for path in self.paths] if verbose else []
+        total = sum(count for count, _ in self.deleted.values())
+        totalBytes = sum(size for _, size in self.deleted.values())
+        lines.append(f'{verb} {total} files({_human(totalBytes)}), kept {self.kept} files({_human(self.kept_bytes)})')
+        for reason, (count, size) in sorted(self.deleted.items()):
+            lines.append(f'  {reason}: {count} files({_human(size)})')
+        for path, error in self.errors:
+            lines.append(f'  Error removing {path}: {error}')
+        return '\n'.join(lines)
+
+
+def _human(size: int) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+
+
+def parse_size(text: str) -> int:
+    '''"500M", "2G", "100k" or plain bytes.'''
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([kmgt]?)b?\s*', text.lower())
+    if not match:
+        raise ValueError(f'Invalid size: {text}')
+    return int(float(match[1]) * 1024 ** ' kmgt'.index(match[2] or ' '))
+
+
+def record_run(started: float, failed: list[str], ledger: str = RUN_LEDGER) -> None:
+    '''Appends a finished test run to the ledger, prune() uses it to tell runs and failed tests apart.'''
+    os.makedirs(os.path.dirname(ledger), exist_ok=True)
+    with open(ledger, 'a', encoding='utf-8') as ledgerFile:
+        ledgerFile.write(json.dumps({'started': started, 'failed': failed}) + '\n')
+
+
+def load_runs(ledger: str = RUN_LEDGER) -> list[dict]:
+    '''Recorded runs, oldest first.'''
+    runs = []
+    try:
+        with open(ledger, encoding='utf-8') as ledgerFile:
+            for line in ledgerFile:
+                try:
+                    runs.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # a run killed while writing its line
+    except FileNotFoundError:
+        pass
+    return sorted(runs, key=lambda run: run['started'])
+
+
+def scan(*dirs: str) -> list[Artifact]:
+    '''All files under the directories, one stat per file. Dotfiles and placeholders are left out.'''
+    artifacts = []
+    stack = [d for d in dirs if os.path.isdir(d)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') or entry.name in PROTECTED:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    stat = entry.stat(follow_symlinks=False)
+                    artifacts.append(Artifact(entry.path, stat.st_size, stat.st_mtime))
+    return artifacts
+
+
+def _is_failure(artifact: Artifact, runs: list[dict]) -> bool:
+    if artifact.run < 0:
+        return True  # nothing is known about it, so it might be
+    failed = runs[artifact.run].get('failed', [])
+    name = os.path.basename(artifact.path)
+    match = LOG_NAME.match(name)
+    if match:
+        return match['test'] in failed
+    if name.endswith(('.log.gz', '.index.json')):
+        return bool(failed)  # a worker archive holds the logs of many tests
+    return True  # screenshots, DOM snapshots and console logs are only saved for failures
+
+
+def plan(artifacts: list[Artifact], policy: RetentionPolicy | None, runs: list[dict], now: float) -> list[tuple[Artifact, str]]:
+    '''Returns (artifact, reason) of everything the policy deletes, no policy deletes everything.'''
+    if policy is None:
+        return [(artifact, 'all') for artifact in artifacts]
+
+    starts = [run['started'] for run in runs]
+    for artifact in artifacts:
+        # the run a file belongs to is the last one that started before the file was written
+        artifact.run = bisect.bisect_right(starts, artifact.mtime) - 1
+
+    doomed, kept = [], []
+    runIds = sorted({artifact.run for artifact in artifacts})
+    keptRuns = set(runIds[max(len(runIds) - policy.keep_runs, 0):]) if policy.keep_runs is not None else set(runIds)
+    for artifact in artifacts:
+        if artifact.run not in keptRuns:
+            doomed.append((artifact, f'older than the last {policy.keep_runs} runs'))
+        elif policy.max_age_days is not None and now - artifact.mtime > policy.max_age_days * 86400:
+            doomed.append((artifact, f'older than {policy.max_age_days:g} days'))
+        elif policy.keep_failures_only and not _is_failure(artifact, runs):
+            doomed.append((artifact, 'test passed'))
+        else:
+            kept.append(artifact)
+
+    if policy.max_bytes is not None:
+        total = sum(artifact.size for artifact in kept)
+        for artifact in sorted(kept, key=lambda artifact: artifact.mtime):
+            if total <= policy.max_bytes:
+                break
+            doomed.append((artifact, f'over {_human(policy.max_bytes)}'))
+            total -= artifact.size
+    return doomed
+
+
+def _unlink(path: str) -> OSError | None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        return e
+    return None
+
+
+def _remove_empty_dirs(*dirs: str) -> None:
+    for dirpath in dirs:
+        for root, subdirs, files in os.walk(dirpath, topdown=False):
+            if root != dirpath and not os.listdir(root):
+                os.rmdir(root)
+
+
+def prune(*dirs: str, policy: RetentionPolicy | None = None, dry_run: bool = False,
+          threads: int = UNLINK_THREADS, ledger: str = RUN_LEDGER) -> PruneReport:
+    '''
+    Deletes what the retention policy doesn't keep from the directories, in a thread pool.
+    Without a policy everything is deleted. On a dry run nothing is touched, the report says what would be.
+    '''
+    artifacts = scan(*dirs)
+    runs = load_runs(ledger)
+    doomed = plan(artifacts, policy, runs, time.time())
+
+    report = PruneReport(dry_run)
+    for artifact, reason in doomed:
+        report.add(artifact, reason)
+    doomedPaths = set(report.paths)
+    for artifact in artifacts:
+        if artifact.path not in doomedPaths:
+            report.kept += 1
+            report.kept_bytes += artifact.size
+
+    if not dry_run and doomed:
+        # unlink is I/O bound, on network or overlay filesystems most of it is waiting
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for path, error in zip(report.paths, executor.map(_unlink, report.paths, chunksize=64)):
+                if error is not None:
+                    report.errors.append((path, error))
+        _remove_empty_dirs(*dirs)
+    return report
+
 
 def clearLogs(*dirsToClear: str) -> None:
     """
@@ -6,46 +215,45 @@ def clearLogs(*dirsToClear: str) -> None:
     Handles cases where directories don't exist.
     """
     for dirpath in dirsToClear:
-        if os.path.exists(dirpath):
-            if os.path.isdir(dirpath):
-                print(f"Clearing directory: {dirpath}")
-                for filename in os.listdir(dirpath):
-                    filepath = os.path.join(dirpath, filename)
-                    try:
-                        if os.path.isfile(filepath) or os.path.islink(filepath):
-                            os.remove(filepath)
-                            print(f"  Removed file: {filepath}")
-                        elif os.path.isdir(filepath):
-                            # This will remove subdirectories and their contents
-                            shutil.rmtree(filepath)
-                            print(f"  Removed directory: {filepath}")
-                    except OSError as e:
-                        print(f"  Error removing {filepath}: {e}")
-            else:
-                print(f"Warning: Path is not a directory: {dirpath}")
-        else:
+        if not os.path.exists(dirpath):
             print(f"Directory not found: {dirpath}")
+        elif not os.path.isdir(dirpath):
+            print(f"Warning: Path is not a directory: {dirpath}")
+    dirs = [dirpath for dirpath in dirsToClear if os.path.isdir(dirpath)]
+    if dirs:
+        print(f"Clearing: {', '.join(dirs)}")
+        print(prune(*dirs).format())
 
-if __name__ == "__main__": 
+if __name__ == "__main__":
     usageGuide = '''                             USAGE:
-    Make sure your current working directory is 'nomad_test' 
+    Make sure your current working directory is 'nomad_test'
     (or the parent of 'logs' and 'screenshots').
 
-    After the script name, type "screenshots" to delete all screenshots, 
-    "logs" to delete all logs, or "all" to delete both.'''
-    if len(sys.argv) != 2:
-        print(usageGuide)
+    After the script name, type "screenshots" to delete all screenshots,
+    "logs" to delete all logs, or "all" to delete both.
+    Add retention options to delete only what they don't keep, e.g.
+    "python clearLogs.py all --keep-runs 5 --max-size 2G --dry-run".'''
+    targets = {'all': ('logs', 'screenshots'), 'screenshots': ('screenshots',), 'logs': ('logs',)}
+
+    parser = argparse.ArgumentParser(usage=usageGuide)
+    parser.add_argument('command', type=str.lower, choices=targets)
+    parser.add_argument('--keep-runs', type=int, help='keep artifacts of the last N test runs')
+    parser.add_argument('--max-age', type=float, metavar='DAYS', help='delete artifacts older than this')
+    parser.add_argument('--max-size', type=parse_size, metavar='SIZE', help='e.g. 500M - delete the oldest artifacts above it')
+    parser.add_argument('--keep-failures-only', action='store_true', help='delete logs of tests that passed')
+    parser.add_argument('--dry-run', action='store_true', help='only report what would be deleted')
+    parser.add_argument('--threads', type=int, default=UNLINK_THREADS, help='threads deleting files')
+    parser.add_argument('-v', '--verbose', action='store_true', help='list every deleted file')
+    args = parser.parse_args()
+
+    dirs = [dirpath for dirpath in targets[args.command] if os.path.isdir(dirpath)]
+    if not dirs:
+        print(f"Directory not found: {', '.join(targets[args.command])}")
         sys.exit(1) # Exit with an error code
 
-    command = sys.argv[1].lower()
-
-    if command == 'all':
-        clearLogs('logs', 'screenshots')
-    elif command == 'screenshots':
-        clearLogs('screenshots')
-    elif command == 'logs':
-        clearLogs('logs')
-    else:
-        print(f"Error: Unknown command '{sys.argv[1]}'.")
-        print(usageGuide)
-        sys.exit(1) # Exit with an error code
\ No newline at end of file
+    policy = None
+    if args.keep_runs is not None or args.max_age is not None or args.max_size is not None or args.keep_failures_only:
+        policy = RetentionPolicy(args.keep_runs, args.max_age, args.max_size, args.keep_failures_only)
+    report = prune(*dirs, policy=policy, dry_run=args.dry_run, threads=args.threads)
+    print(report.format(verbose=args.verbose))
+    sys.exit(1 if report.errors else 0)
@@ -1,8 +1,127 @@
-import logging, pytest, os
+import logging, pytest, os, time
 from pathlib import Path
 from datetime import datetime
-from playwright.sync_api import Playwright, Browser, BrowserContext, Page
-from loginUtils import nomadLogin
+from playwright.sync_api import Browser, BrowserContext, Page
+from loginUtils import ensure_auth_state, ensure_logged_in
+from dbUtils import ConnectionPool, get_pool, close_pool
+from accountPool import AccountPool
+from cleanupUtils import RowTracker, format_deleted, run_id, sweep_ledgers
+from nomadConfig import UserCredentials
+from replayUtils import HAR_MODES, apply_har, har_mode, is_offline
+from networkUtils import RoutingPolicy, install_routing, policy_from_config
+from contextPool import BrowserCache, ContextPool
+from artifactCapture import ARTIFACT_FORMATS, ArtifactWriter, collect_console
+from logUtils import LogPipeline
+from clearLogs import record_run
+from waitUtils import NAVIGATION_TIMEOUT, StepTimeouts, track_network, reset_step_timeout, update_step_history
+from stepTimer import StepRecorder, set_recorder, write_worker_report, clear_worker_reports, merge_reports
+from matrixRunner import BROWSER_MODES
+
+pytest_plugins = ["durationScheduler"]
+
+_step_timings = []  # step timings of all tests this worker ran
+_failed_tests = set()  # names of the failed tests, the controller records them for clearLogs.py
+_browser_tests = set()  # tests that drove a page, a run of unit tests alone isn't recorded
+
+def pytest_addoption(parser):
+    parser.addoption("--har-mode", choices=HAR_MODES, default=None,
+                     help="'record' saves the app's responses of every test to hars/, 'replay' serves them from there "
+                          "without touching the real app or database. Defaults to NOMAD_HAR_MODE or 'off'.")
+    parser.addoption("--step-report-top", type=int, default=10,
+                     help="Number of slowest steps listed after the run, see reports/step_timings.json for all of them.")
+    parser.addoption("--no-context-pool", action="store_true", default=False,
+                     help="Give every test a brand new browser context instead of a reset, reused one.")
+    parser.addoption("--artifact-format", choices=ARTIFACT_FORMATS, default="webp",
+                     help="Image format of failure screenshots.")
+    parser.addoption("--artifact-quality", type=int, default=80,
+                     help="Quality(1-100) of webp and jpeg failure screenshots.")
+    parser.addoption("--artifact-scale", type=float, default=1.0,
+                     help="Downscale factor of failure screenshots, e.g. 0.5 for half the size.")
+    parser.addoption("--no-adaptive-timeouts", action="store_true", default=False,
+                     help="Use the default action timeout for every step instead of one learned from previous runs.")
+    parser.addoption("--log-archive", action="store_true", default=False,
+                     help="Write one gzip log per worker(with an index of its tests) instead of a log file per test.")
+    parser.addoption("--browser-mode", action="append", choices=BROWSER_MODES, default=None,
+                     help="Run every test in this mode, repeat it for several(e.g. with several --browser, "
+                          "see matrixRunner.py). Overrides --headed.")
+    parser.addini("net_block_resource_types", type="args", default=sorted(RoutingPolicy.blockedResourceTypes),
+                  help="Playwright resource types the browser never downloads during tests.")
+    parser.addini("net_block_urls", type="linelist", default=list(RoutingPolicy.blockedUrls),
+                  help="Regular expressions of URLs the browser never downloads during tests.")
+    parser.addini("net_allow_hosts", type="linelist", default=[],
+                  help="If set, only these hosts(and their subdomains) can be reached during tests.")
+    parser.addini("net_cache_dir", default=RoutingPolicy.cacheDir,
+                  help="Directory of the static asset cache shared by all workers, 'off' disables it.")
+    parser.addini("net_cache_max_age", default=str(RoutingPolicy.cacheMaxAge),
+                  help="Seconds after which a cached static asset is downloaded again.")
+
+
+def pytest_configure(config):
+    # the environment variable is inherited by xdist workers and read by the testers themselves
+    if config.getoption("--har-mode"):
+        os.environ["NOMAD_HAR_MODE"] = config.getoption("--har-mode")
+    har_mode()  # fail early on an invalid NOMAD_HAR_MODE
+    config._artifact_writer = ArtifactWriter(imageFormat=config.getoption("--artifact-format"),
+                                             quality=config.getoption("--artifact-quality"),
+                                             scale=config.getoption("--artifact-scale"))
+    if not hasattr(config, "workerinput"):
+        config._run_started = time.time()
+        clear_worker_reports()
+        run_id()  # every worker tags its rows with the controller's run id
+
+
+def pytest_sessionstart(session):
+    # rows of earlier runs that died before their teardown, deleted once by the controller(see sweep_ledgers())
+    if hasattr(session.config, "workerinput") or session.config.option.collectonly or is_offline():
+        return
+    try:
+        deleted = sweep_ledgers()
+        if deleted:
+            logging.info(f"CLEANUP: Deleted rows left by earlier runs: {format_deleted(deleted)}")
+    except Exception as E:
+        logging.error(f"CLEANUP: Couldn't delete rows left by earlier runs: {E}")
+
+
+def pytest_generate_tests(metafunc):
+    # a second matrix axis next to pytest-playwright's --browser
+    modes = metafunc.config.getoption("--browser-mode")
+    if modes and "browser_mode" in metafunc.fixturenames:
+        metafunc.parametrize("browser_mode", modes, scope="session")
+
+
+def pytest_runtest_logreport(report):
+    if report.failed:
+        _failed_tests.add(report.nodeid.split("::")[-1])
+    if ("browser", True) in report.user_properties:
+        _browser_tests.add(report.nodeid)
+
+
+def pytest_sessionfinish(session):
+    session.config._artifact_writer.flush()
+    if _step_timings:
+        write_worker_report(_step_timings)
+    # the controller(or a run without xdist) merges what all workers recorded
+    if not hasattr(session.config, "workerinput"):
+        session.config._step_report = merge_reports()
+        report = session.config._step_report
+        if report and _browser_tests and not session.config.option.collectonly:
+            # failed steps took as long as their timeout, they would only inflate the timeouts
+            update_step_history([timing for timing in report["steps"] if timing["test"].split("::")[-1] not in _failed_tests],
+                                har_mode())
+        if _browser_tests and not session.config.option.collectonly:
+            record_run(session.config._run_started, sorted(_failed_tests))
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    report = getattr(config, "_step_report", None)
+    top = config.getoption("--step-report-top")
+    if not report or not report["summary"] or top <= 0:
+        return
+    terminalreporter.section(f"{top} slowest steps(p95)")
+    for row in report["summary"][:top]:
+        terminalreporter.write_line(f"{row['p95_ms']:>9.0f} ms  p50 {row['p50_ms']:>7.0f} ms  x{row['count']:<3} {row['step']}")
+    terminalreporter.write_line("All step timings: reports/step_timings.json, reports/step_timings.csv")
+
 
 @pytest.fixture(scope="session")
 def browser_context_args(browser_context_args):
@@ -15,13 +134,118 @@ def browser_context_args(browser_context_args):
         "geolocation": {"latitude": 50.0755, "longitude": 14.4378}, 
         "ignore_https_errors": True,
         "bypass_csp": True,
-        "java_script_enabled": True
+        "java_script_enabled": True,
+        "service_workers": "block" # requests served by a service worker would bypass the routing below
     }
 
+
+@pytest.fixture(scope="session")
+def routing_policy(pytestconfig) -> RoutingPolicy:
+    '''What the browser may download and cache during tests, configured by the net_* options in pytest.ini.'''
+    return policy_from_config(pytestconfig)
+
+@pytest.fixture(scope="session", autouse=True)
+def db_pool() -> ConnectionPool:
+    '''Database connection pool of this xdist worker. It connects lazily, so tests that never
+    query the database don't open connections, and all connections are closed once the session ends.'''
+    yield get_pool()
+    close_pool()
+
+
+@pytest.fixture(scope="session")
+def row_tracker(db_pool: ConnectionPool) -> RowTracker | None:
+    '''Rows this xdist worker created, all deleted in one transaction when the session ends(or by the next session,
+    if this one dies). None while recording or replaying traffic: the rows are created with the values of creds.csv
+    and scenarios/ then(recorded requests are matched by their body) and cleaned up before each test.'''
+    if har_mode() != "off":
+        yield None
+        return
+    tracker = RowTracker()
+    yield tracker
+    try:
+        deleted = tracker.teardown()
+        if deleted:
+            logging.info(f"CLEANUP: Deleted {format_deleted(deleted)}")
+    except Exception as E:
+        logging.error(f"CLEANUP: Couldn't delete the rows of {tracker.namespace}, the next session will: {E}")
+
+
+@pytest.fixture(scope="session")
+def account_pool(row_tracker: RowTracker | None) -> AccountPool | None:
+    '''Pre-created accounts of creds.csv leased to one test at a time and registration e-mails deleted with the
+    worker's other rows. None while recording or replaying traffic - recorded requests are matched by their body, so
+    both have to use the accounts of creds.csv.'''
+    if row_tracker is None or har_mode() != "off":
+        yield None
+        return
+    pool = AccountPool(tracker=row_tracker)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def test_credentials(account_pool: AccountPool | None) -> UserCredentials | None:
+    '''Credentials of a pre-created account leased to this test alone. None when replaying or if creds.csv lists
+    no accounts for the pool, the test then logs in with the login account of creds.csv.'''
+    if account_pool is None or not account_pool.accounts:
+        yield None
+        return
+    with account_pool.lease() as account:
+        yield account_pool.credentials(account)
+
+
+@pytest.fixture
+def registration_credentials(account_pool: AccountPool | None) -> UserCredentials | None:
+    '''Credentials with a registration e-mail no other test uses, for tests that register. None when replaying.'''
+    if account_pool is None:
+        return None
+    return account_pool.registration_credentials()
+
+
+@pytest.fixture(scope="session")
+def step_timeouts(pytestconfig) -> StepTimeouts:
+    '''Action timeouts per step learned from previous runs of the same --har-mode, see waitUtils.py.'''
+    if pytestconfig.getoption("--no-adaptive-timeouts"):
+        return StepTimeouts()
+    return StepTimeouts.load(har_mode())
+
+
 @pytest.fixture(autouse=True)
-def configure_timeouts(page):
-    page.set_default_timeout(15000) 
-    page.set_default_navigation_timeout(10000)  
+def configure_timeouts(request, step_timeouts: StepTimeouts):
+    # only configure pages the test actually uses, so that tests on auth_page don't open an extra context
+    for fixture_name in ("page", "auth_page"):
+        if fixture_name in request.fixturenames:
+            page = request.getfixturevalue(fixture_name)
+            page.set_default_timeout(step_timeouts.default) # each step of the flows then sets its own
+            page.set_default_navigation_timeout(NAVIGATION_TIMEOUT)
+            track_network(page)
+
+
+@pytest.fixture(scope="session")
+def browser_mode() -> str | None:
+    '''"headless" or "headed" when tests are parametrized by --browser-mode, otherwise None(--headed decides).'''
+    return None
+
+
+@pytest.fixture(scope="session")
+def browser_type_launch_args(browser_type_launch_args, browser_mode):
+    if browser_mode is None:
+        return browser_type_launch_args
+    return {**browser_type_launch_args, "headless": browser_mode == "headless"}
+
+
+@pytest.fixture(scope="session")
+def browser_cache() -> BrowserCache:
+    '''Browsers this worker launched, kept warm for the whole session even when tests alternate between them.'''
+    cache = BrowserCache()
+    yield cache
+    cache.close()
+
+
+@pytest.fixture(scope="session")
+def browser(browser_cache: BrowserCache, launch_browser, browser_name: str, browser_type_launch_args) -> Browser:
+    '''Same as pytest-playwright's browser, but taken from the worker's cache instead of launched per parameter.'''
+    return browser_cache.browser(browser_name, browser_type_launch_args, launch_browser)
 
 
 @pytest.fixture(scope="session")
@@ -48,77 +272,155 @@ def browser_launch_args():
 
 
 @pytest.fixture(autouse=True)
-def per_test_logging(request):
+def step_timings(request, step_timeouts: StepTimeouts):
+    '''Records how long each step of the test's flow takes(see stepTimer.py) and gives each step its timeout.'''
+    pages = [request.getfixturevalue(fixture_name) for fixture_name in ("page", "auth_page")
+             if fixture_name in request.fixturenames]
+    recorder = StepRecorder(request.node.nodeid, onStep=lambda step: step_timeouts.apply(pages, step))
+    for page in pages:
+        recorder.attach(page)
+    set_recorder(recorder)
+    yield recorder
+    recorder.finish()
+    set_recorder(None)
+    reset_step_timeout()
+    _step_timings.extend(recorder.timings)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def log_pipeline(pytestconfig) -> LogPipeline:
+    '''Queue-based logging of this xdist worker, set up once per session, see logUtils.py.'''
+    pipeline = LogPipeline(archive=pytestconfig.getoption("--log-archive"))
+    pipeline.start()
+    yield pipeline
+    pipeline.stop()
+
+
+@pytest.fixture(autouse=True)
+def per_test_logging(request, log_pipeline: LogPipeline):
     test_name = request.node.name
-    log_dir = "logs"
-    os.makedirs(log_dir, exist_ok=True)
-    log_file = os.path.join(log_dir, f"{test_name}_{datetime.now().strftime('%H-%M-%S-%f')}.log")
-    
-    # Get the root logger
-    logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)  # Logger itself accepts all levels
-    
-    # Remove existing handlers to avoid duplicates
-    for handler in logger.handlers[:]:
-        logger.removeHandler(handler)
-    
-    # File handler - logs ALL levels (DEBUG and above)
-    file_handler = logging.FileHandler(log_file, mode='w')
-    file_handler.setLevel(logging.DEBUG)  # File gets everything
-    file_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    file_handler.setFormatter(file_formatter)
-    logger.addHandler(file_handler)
-    
-    # Console handler - logs only ERROR and above
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.ERROR)  # Console gets only ERROR and CRITICAL
-    console_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    console_handler.setFormatter(console_formatter)
-    logger.addHandler(console_handler)
-    
+    # records of this test go to its own file(or its part of the worker archive)
+    token = log_pipeline.start_test(test_name)
     logging.info(f"--- STARTING {test_name} ---")
     
     yield
     
     logging.info(f"--- END OF {test_name} --- \n")
-    
-    # Clean up handlers
-    logger.removeHandler(file_handler)
-    logger.removeHandler(console_handler)
-    file_handler.close()
+    log_pipeline.end_test(token)
+
+
+@pytest.fixture(autouse=True)
+def console_log(request) -> list[str]:
+    '''Console messages of the test's page, saved next to the screenshot if the test fails.'''
+    messages = []
+    for fixture_name in ("page", "auth_page"):
+        if fixture_name in request.fixturenames:
+            collect_console(request.getfixturevalue(fixture_name), messages)
+    request.node._console_log = messages
+    return messages
 
 
 @pytest.hookimpl(tryfirst=True, hookwrapper=True)
 def pytest_runtest_makereport(item, call):
     outcome = yield
     rep = outcome.get_result()
+    if rep.when == "call" and {"page", "auth_page"} & set(item.fixturenames):
+        rep.user_properties.append(("browser", True))  # travels to the xdist controller with the report
     
     # Check if a test failed
     if rep.when == "call" and rep.failed:
         page = None
         for fixture_name in item.fixturenames:
-            if fixture_name == "page":
+            if fixture_name in ("page", "auth_page"):
                 page = item.funcargs[fixture_name]
                 break
                 
         if page:
             timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
             test_name = item.nodeid.replace("/", "_").replace(":", "_")
-            screenshotPath = Path(f"screenshots/failure-{test_name}-{timestamp}.png")
-            page.screenshot(path=screenshotPath)
-            print(f"Screenshot saved to {screenshotPath}")
+            # encoding and writing happen in the background, the worker can go on with the next test
+            screenshotPath = item.config._artifact_writer.capture(page, f"failure-{test_name}-{timestamp}",
+                                                                  getattr(item, "_console_log", []))
+            print(f"Screenshot, DOM and console log will be saved to {screenshotPath}")
+
+
+
+def route_context(context: BrowserContext, policy: RoutingPolicy, harName: str) -> None:
+    '''Applies the routing policy and then the recorded traffic, recordings take precedence over the policy.'''
+    install_routing(context, policy)
+    apply_har(context, harName)
+
+
+@pytest.fixture(scope="session")
+def context_pool(browser: Browser, browser_context_args, browser_cache: BrowserCache) -> ContextPool:
+    '''Warm browser contexts of this xdist worker, reset between tests instead of created anew.
+    There is one pool per browser, the cache closes them at the end of the session.'''
+    return browser_cache.context_pool(browser, browser_context_args)
+
+
+def can_reuse_context(request) -> bool:
+    '''Contexts can't be reused when they have to be closed to save something(HAR recordings, traces,
+    videos, pytest-playwright's failure screenshots) or when the test asks for its own context arguments.'''
+    config = request.config
+    return not (config.getoption("--no-context-pool")
+                or har_mode() == "record"
+                or config.getoption("--tracing") != "off"
+                or config.getoption("--video") != "off"
+                or config.getoption("--screenshot") != "off"
+                or request.node.get_closest_marker("browser_context_args"))
+
+
+@pytest.fixture
+def context(new_context, context_pool: ContextPool, routing_policy: RoutingPolicy, request) -> BrowserContext:
+    '''Same as pytest-playwright's context, but reused from the worker's pool when possible, with third party
+    traffic blocked or cached and the app's traffic recorded or replayed when --har-mode is set.'''
+    if not can_reuse_context(request):
+        context = new_context()
+        route_context(context, routing_policy, request.node.name)
+        yield context
+        return
+
+    context = context_pool.acquire()
+    route_context(context, routing_policy, request.node.name)
+    yield context
+    context_pool.release(context)
+
+
+@pytest.fixture(scope="session")
+def auth_state(browser: Browser, browser_name: str, browser_context_args, routing_policy: RoutingPolicy) -> Path:
+    '''Logs in once per xdist worker and returns the path of the saved storage state(cookies + localStorage).
+    A still valid state from a previous run is reused without opening the login form at all.'''
+    # a recording needs the login traffic in it, so that replays can log in again once the state expires
+    return ensure_auth_state(browser, browser_context_args, browser_name,
+                             refresh=har_mode() == "record",
+                             setupContext=lambda context: route_context(context, routing_policy, f"auth_state[{browser_name}]"))
+
+
+@pytest.fixture
+def auth_context(new_context, auth_state: Path, routing_policy: RoutingPolicy, request) -> BrowserContext:
+    '''Fresh context that is already authenticated by the worker's storage state.'''
+    context = new_context(storage_state=auth_state)
+    route_context(context, routing_policy, request.node.name)
+    return context
+
 
+@pytest.fixture
+def auth_page(auth_context: BrowserContext, auth_state: Path) -> Page:
+    '''Page opened on the app in an authenticated state, logs in again if the saved session expired.'''
+    page = auth_context.new_page()
+    ensure_logged_in(page, auth_state)
+    return page
 
 
 @pytest.fixture(scope="session")
-def codegen_context(browser: Browser, browser_context_args):
+def codegen_context(browser: Browser, browser_context_args, auth_state: Path):
     '''Special fixture for playwright codegen that maintains login state.
     Uses browser from pytest-playwright.'''
 
-    context = browser.new_context(**browser_context_args)
+    context = browser.new_context(**browser_context_args, storage_state=auth_state)
     
     page = context.new_page()
-    nomadLogin(page)
+    ensure_logged_in(page, auth_state)
     
     yield context, page
     
@@ -0,0 +1,143 @@
+import json, logging
+from typing import Callable
+from urllib.parse import urlsplit
+from playwright.sync_api import Browser, BrowserContext, Frame
+
+CONTEXT_POOL_SIZE = 2  # idle contexts kept per worker - a worker runs one test at a time
+
+
+class ContextResetError(Exception):
+    '''Raised when a context can't be brought back to a clean state and has to be replaced.'''
+
+
+class ContextPool:
+    '''
+    Warm browser contexts of one xdist worker, all created with the same arguments.
+    Instead of closing a context after a test it gets reset - pages closed, cookies, storage, permissions,
+    routes and headers cleared, geolocation reapplied - and handed to the next test.
+    Locale, timezone and user agent can't change on a live context, they stay as browser_context_args set them.
+    Clearing storage needs the Chrome DevTools Protocol, so other browsers get a fresh context every time.
+    '''
+
+    def __init__(self, browser: Browser, contextArgs: dict, size: int = CONTEXT_POOL_SIZE):
+        self.browser = browser
+        self.contextArgs = dict(contextArgs)
+        self.size = size
+        self._idle: list[BrowserContext] = []
+        self._origins: dict[BrowserContext, set[str]] = {}
+
+    @property
+    def can_reset(self) -> bool:
+        return self.browser.browser_type.name == 'chromium'
+
+    def _track_origins(self, context: BrowserContext) -> None:
+        origins = self._origins.setdefault(context, set())
+
+        def on_navigated(frame: Frame) -> None:
+            url = urlsplit(frame.url)
+            if url.scheme in ('http', 'https'):
+                origins.add(f'{url.scheme}://{url.netloc}')
+
+        context.on('page', lambda page: page.on('framenavigated', on_navigated))
+
+    def acquire(self) -> BrowserContext:
+        '''Returns a clean context, warm from the pool if there is one.'''
+        if self._idle:
+            return self._idle.pop()
+        context = self.browser.new_context(**self.contextArgs)
+        self._track_origins(context)
+        return context
+
+    def release(self, context: BrowserContext) -> None:
+        '''Resets the context for the next test, or closes it if that fails or the pool is full.'''
+        if not self.can_reset or len(self._idle) >= self.size:
+            self._close(context)
+            return
+        try:
+            self.reset(context)
+        except Exception as E:
+            logging.debug(f'CONTEXT POOL: Reset failed, using a fresh context next time: {E}')
+            self._close(context)
+            return
+        self._idle.append(context)
+
+    def reset(self, context: BrowserContext) -> None:
+        '''Brings the context back to the state browser.new_context(**contextArgs) would create.'''
+        for page in context.pages:
+            page.close()
+        context.unroute_all(behavior='ignoreErrors')
+        context.clear_cookies()
+        context.clear_permissions()
+        if self.contextArgs.get('permissions'):
+            context.grant_permissions(self.contextArgs['permissions'])
+        context.set_geolocation(self.contextArgs.get('geolocation'))
+        context.set_extra_http_headers(self.contextArgs.get('extra_http_headers') or {})
+        context.set_offline(self.contextArgs.get('offline', False))
+
+        origins = self._origins.get(context, set())
+        if origins:
+            page = context.new_page()
+            try:
+                cdp = context.new_cdp_session(page)
+                for origin in origins:
+                    # localStorage, IndexedDB, cache storage, service workers, ...
+                    cdp.send('Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': 'all'})
+                cdp.detach()
+            except Exception as E:
+                raise ContextResetError(f'Could not clear storage: {E}') from E
+            finally:
+                page.close()
+            origins.clear()
+
+        if context.pages:
+            raise ContextResetError('Pages were opened during the reset.')
+
+    def _close(self, context: BrowserContext) -> None:
+        self._origins.pop(context, None)
+        try:
+            context.close()
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        '''Closes all idle contexts.'''
+        while self._idle:
+            self._close(self._idle.pop())
+
+
+class BrowserCache:
+    '''
+    Warm browsers of one xdist worker, keyed by browser name and launch arguments, each with its ContextPool.
+    pytest closes a session fixture whenever its parameter changes, so in a browser matrix(--browser chromium
+    --browser firefox, see matrixRunner.py) a worker alternating between browsers would launch them over and over.
+    The cache keeps every browser the worker used open until the session ends.
+    '''
+
+    def __init__(self):
+        self._browsers: dict[str, Browser] = {}
+        self._pools: dict[Browser, ContextPool] = {}
+
+    def browser(self, name: str, launchArgs: dict, launch: Callable[[], Browser]) -> Browser:
+        key = name + json.dumps(launchArgs, sort_keys=True, default=str)
+        browser = self._browsers.get(key)
+        if browser is None or not browser.is_connected():
+            logging.debug(f'BROWSER CACHE: Launching {name}(headless={launchArgs.get("headless", True)}).')
+            browser = self._browsers[key] = launch()
+        return browser
+
+    def context_pool(self, browser: Browser, contextArgs: dict) -> ContextPool:
+        pool = self._pools.get(browser)
+        if pool is None:
+            pool = self._pools[browser] = ContextPool(browser, contextArgs)
+        return pool
+
+    def close(self) -> None:
+        for pool in self._pools.values():
+            pool.close()
+        self._pools.clear()
+        for browser in self._browsers.values():
+            try:
+                browser.close()
+            except Exception:
+                pass
+        self._browsers.clear()
@@ -0,0 +1,168 @@
+import logging, os, queue, threading, time
+from mysql.connector import MySQLConnection
+from nomadConfig import load_db_credentials
+
+DB_POOL_SIZE = int(os.environ.get('NOMAD_DB_POOL_SIZE', 2))  # per xdist worker - a worker runs one test at a time
+DB_ACQUIRE_TIMEOUT = 30  # seconds to wait for a free connection before giving up
+DB_PING_AFTER = 30  # seconds a connection may sit idle before it gets pinged on checkout
+_SLOT_FREED = None  # queued when a connection is dropped, wakes a waiter that may open a new one instead
+
+
+def get_db_credentials(dbCredsDir: str) -> list:
+    '''Reads and returns database credentials from a csv, parsed only once per process(see nomadConfig.py).'''
+    return list(load_db_credentials(dbCredsDir))
+
+
+class PooledConnection:
+    '''
+    Wrapper of a MySQLConnection borrowed from a ConnectionPool.
+    Behaves like the connection itself, but close() hands it back to the pool instead of closing it.
+    '''
+
+    def __init__(self, pool: 'ConnectionPool', connection: MySQLConnection):
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name):
+        if self._connection is None:
+            raise AttributeError(f'Connection was already returned to the pool: {name}')
+        return getattr(self._connection, name)
+
+    def close(self) -> None:
+        '''Returns the connection to the pool, calling it again does nothing.'''
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            self._pool.release(connection)
+
+    def __del__(self):
+        # testers which never close their connection still give it back once they are garbage collected
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __repr__(self):
+        return f'PooledConnection({self._connection!r})'
+
+
+class ConnectionPool:
+    '''
+    Small, lazily connecting pool of buffered MySQL connections.
+    Connections are only opened when a test actually asks for one, so starting many xdist workers
+    doesn't burst the database with handshakes. Idle connections get pinged before they are handed out.
+    '''
+
+    def __init__(self, size: int = DB_POOL_SIZE, dbCredsDir: str | None = None):
+        self.size = size
+        self.dbCredsDir = dbCredsDir
+        self._idle = queue.LifoQueue()  # most recently used first - it is the one least likely to have timed out
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self) -> MySQLConnection:
+        dbHost, dbUser, dbPwd, dbName = load_db_credentials(self.dbCredsDir)
+        connection = MySQLConnection(
+            host = dbHost, user = dbUser,
+            password = dbPwd, database = dbName,
+            buffered = True)
+        logging.debug(f'DB POOL: Opened connection {self._created}/{self.size}.')
+        return connection
+
+    def _is_healthy(self, connection: MySQLConnection, idleSince: float) -> bool:
+        if time.monotonic() - idleSince < DB_PING_AFTER:
+            return True
+        return connection.is_connected()
+
+    def acquire(self, timeout: float = DB_ACQUIRE_TIMEOUT) -> PooledConnection:
+        '''Borrows a connection, opening a new one only if none is idle and the pool isn't full yet.'''
+        if self._closed:
+            raise RuntimeError('Connection pool is closed.')
+
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                item = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    canCreate = self._created < self.size
+                    if canCreate:
+                        self._created += 1
+                if canCreate:
+                    try:
+                        return PooledConnection(self, self._connect())
+                    except Exception:
+                        self._free_slot()
+                        raise
+                try:
+                    item = self._idle.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    raise TimeoutError(f'No database connection became free within {timeout} s.')
+
+            if item is _SLOT_FREED:
+                continue  # a connection was dropped, there's room for a new one
+            connection, idleSince = item
+            if self._is_healthy(connection, idleSince):
+                return PooledConnection(self, connection)
+
+            logging.debug('DB POOL: Dropped a dead connection.')
+            self._discard(connection)
+
+    def release(self, connection: MySQLConnection) -> None:
+        '''Takes a connection back, rolling back whatever its borrower left uncommitted.'''
+        if self._closed:
+            self._discard(connection)
+            return
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except Exception as E:
+            logging.debug(f'DB POOL: Dropped a connection that failed to roll back: {E}')
+            self._discard(connection)
+            return
+        self._idle.put((connection, time.monotonic()))
+
+    def _free_slot(self) -> None:
+        with self._lock:
+            self._created -= 1
+        if not self._closed:
+            self._idle.put(_SLOT_FREED)
+
+    def _discard(self, connection: MySQLConnection) -> None:
+        self._free_slot()
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        '''Closes all idle connections, borrowed ones are closed as soon as they come back.'''
+        self._closed = True
+        while True:
+            try:
+                item = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _SLOT_FREED:
+                self._discard(item[0])
+
+
+_pool = None
+_poolLock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    '''Returns the connection pool of this process(= of this xdist worker), creating it on first use.'''
+    global _pool
+    with _poolLock:
+        if _pool is None or _pool._closed:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def close_pool() -> None:
+    '''Closes the pool of this process if there is one.'''
+    global _pool
+    with _poolLock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
@@ -0,0 +1,154 @@
+'''
+pytest plugin that hands tests to xdist workers longest first, using durations of previous runs.
+
+Durations are kept in pytest's cache(.pytest_cache) as a moving average per test. Tests marked with
+pytest.mark.order(n) are started in the order of their markers, the rest is slotted in between them
+by duration. Without any history the collection order is kept, so the first run behaves like "--dist load".
+'''
+import statistics
+import pytest
+from xdist.scheduler import LoadScheduling
+
+HISTORY_KEY = 'nomad/durations'
+HISTORY_WEIGHT = 0.5  # weight of the newest run in the moving average
+
+
+def order_of(item) -> int | None:
+    '''Returns n of the item's pytest.mark.order(n) marker, None if it has none.'''
+    marker = item.get_closest_marker('order')
+    if marker is None:
+        return None
+    return marker.args[0] if marker.args else marker.kwargs.get('index')
+
+
+def _order_key(order: int) -> tuple:
+    # like pytest-order: 0, 1, 2, ... first, negative ones(counted from the end) last
+    return (1, order) if order < 0 else (0, order)
+
+
+def plan_order(collection: list[str], history: dict) -> list[int]:
+    '''
+    Returns indices into the collection in the order they should be handed out.
+    Unmarked tests go longest first, marked ones keep the order of their markers - whenever the next
+    marked test is at least as long as the longest unmarked one, it goes first.
+    Tests without history count as the median duration of the others.
+    '''
+    known = [entry['duration'] for entry in history.values()]
+    if not known:
+        return list(range(len(collection)))
+    default = statistics.median(known)
+
+    def estimate(index: int) -> float:
+        return history.get(collection[index], {}).get('duration', default)
+
+    def order(index: int) -> int | None:
+        return history.get(collection[index], {}).get('order')
+
+    marked = sorted((i for i in range(len(collection)) if order(i) is not None), key=lambda i: _order_key(order(i)))
+    unmarked = sorted((i for i in range(len(collection)) if order(i) is None), key=estimate, reverse=True)
+
+    planned = []
+    while marked and unmarked:
+        if estimate(marked[0]) >= estimate(unmarked[0]):
+            planned.append(marked.pop(0))
+        else:
+            planned.append(unmarked.pop(0))
+    return planned + marked + unmarked
+
+
+class DurationScheduling(LoadScheduling):
+    '''
+    LoadScheduling which hands out tests one by one in the order of plan_order(), so a long test can't
+    end up queued behind a batch of short ones on a busy worker(longest processing time first).
+    '''
+
+    def __init__(self, config, log=None, history: dict | None = None):
+        super().__init__(config, log)
+        self.history = history or {}
+        self.maxschedchunk = 1
+
+    def schedule(self) -> None:
+        assert self.collection_is_completed
+
+        if self.collection is not None:
+            for node in self.nodes:
+                self.check_schedule(node)
+            return
+
+        if not self._check_nodes_have_same_collection():
+            self.log("**Different tests collected, aborting run**")
+            return
+
+        self.collection = next(iter(self.node2collection.values()))
+        if not self.collection:
+            return
+        self.pending[:] = plan_order(self.collection, self.history)
+
+        # a worker needs two tests queued to start running the first one. The second round goes
+        # in reverse, so the worker which got the longest test gets the shortest of the round after it.
+        nodes = self.nodes
+        for node in nodes + nodes[::-1]:
+            self._send_tests(node, 1)
+
+        if not self.pending:
+            for node in self.nodes:
+                node.shutdown()
+
+
+def pytest_addoption(parser):
+    parser.addoption("--no-duration-scheduling", action="store_true", default=False,
+                     help="Use xdist's plain load scheduling instead of handing out the longest tests first.")
+
+
+class DurationHistory:
+    '''Collects durations of this run(from the reports all workers send) and merges them into the history.'''
+
+    def __init__(self, config):
+        self.config = config
+        self.durations = {}
+        self.orders = {}
+        self.ran = set()
+
+    def pytest_runtest_logreport(self, report):
+        self.durations[report.nodeid] = self.durations.get(report.nodeid, 0.0) + report.duration
+        self.orders[report.nodeid] = getattr(report, 'order_marker', None)
+        if report.when == 'call':
+            self.ran.add(report.nodeid)
+
+    def pytest_sessionfinish(self):
+        if not self.ran:
+            return
+        history = self.config.cache.get(HISTORY_KEY, {})
+        for nodeid in self.ran:
+            previous = history.get(nodeid, {}).get('duration')
+            duration = self.durations[nodeid]
+            if previous is not None:
+                duration = HISTORY_WEIGHT * duration + (1 - HISTORY_WEIGHT) * previous
+            history[nodeid] = {'duration': round(duration, 3), 'order': self.orders[nodeid]}
+        self.config.cache.set(HISTORY_KEY, history)
+
+
+def pytest_configure(config):
+    # only the controller(or a run without xdist) sees the reports of all tests
+    if not hasattr(config, 'workerinput') and config.pluginmanager.hasplugin('cacheprovider'):
+        config.pluginmanager.register(DurationHistory(config), 'nomad_duration_history')
+
+
+def pytest_collection_modifyitems(items):
+    # marked tests first(negative ones last) in their order, also without xdist. The sort is stable,
+    # so unmarked tests keep their relative order - every worker has to collect the very same order
+    items.sort(key=lambda item: _order_key(order_of(item)) if order_of(item) is not None else (0.5, 0))
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item):
+    outcome = yield
+    # reports travel from the workers to the controller, which can't see markers itself
+    outcome.get_result().order_marker = order_of(item)
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_xdist_make_scheduler(config, log):
+    if config.getoption("--no-duration-scheduling") or config.getoption("dist") != "load":
+        return None
+    return DurationScheduling(config, log, history=config.cache.get(HISTORY_KEY, {}))
@@ -0,0 +1,45 @@
+'''
+Step plans of the login and registration flows(PlanSteps, see scenarioEngine.py). They are data like the scenario
+plans: nomadTests.py and loginUtils.py run them with run_plan(), asyncRunner.py with run_plan_async().
+The account and the app's url are Params - "url", "email", "username" and "password".
+'''
+from locators import SELECTORS
+from scenarioEngine import Param, PlanStep
+
+
+def _login_steps(label: str) -> tuple[PlanStep, ...]:
+    return (PlanStep(f'{label}: Press manual log in option button.', 'click', SELECTORS['login.manual']),
+            PlanStep(f'{label}: Type e-mail.', 'fill', SELECTORS['login.email'], Param('email')),
+            PlanStep(f'{label}: Type password.', 'fill', SELECTORS['login.password'], Param('password')),
+            PlanStep(f'{label}: Check "remember credentials".', 'click', SELECTORS['login.remember']),
+            PlanStep(f'{label}: Click log in button.', 'click', SELECTORS['login.submit']))
+
+
+# the login form of a page that already shows the app, see nomadLogin()
+LOGIN_PLAN = _login_steps('LOGIN')
+
+MANUAL_LOGIN_PLAN = (PlanStep('MANUAL LOGIN: Open app.', 'goto', value=Param('url')),
+                     *_login_steps('MANUAL LOGIN'))
+
+LOGOUT_PLAN = (PlanStep('MANUAL LOGIN: Click log out button.', 'click', SELECTORS['logout']),)
+
+REGISTRATION_PLAN = (
+    PlanStep('REGISTRATION: Open app.', 'goto', value=Param('url')),
+    PlanStep('REGISTRATION: Select registration menu option.', 'click', SELECTORS['registration.link']),
+    PlanStep('REGISTRATION: Type e-mail', 'fill', SELECTORS['registration.email'], Param('email')),
+    PlanStep('REGISTRATION: Type username.', 'fill', SELECTORS['registration.username'], Param('username')),
+    PlanStep('REGISTRATION: Type password', 'fill', SELECTORS['registration.password'], Param('password')),
+    PlanStep('REGISTRATION: Type password confirmation.', 'fill', SELECTORS['registration.passwordConfirmation'],
+             Param('password')),
+    PlanStep('REGISTRATION: Click UI language form.', 'click', SELECTORS['registration.language']),
+    PlanStep('REGISTRATION: Select english.', 'click', SELECTORS['registration.english']),
+    PlanStep('REGISTRATION: Click spoken languages form.', 'click', SELECTORS['registration.spokenLanguages']),
+    PlanStep('REGISTRATION: Select Italian as second language(first language should be english).', 'click',
+             SELECTORS['registration.italian']),
+    PlanStep('REGISTRATION: Apply chosen languages by clicking [Apply].', 'click', SELECTORS['registration.apply']),
+    PlanStep('REGISTRATION: Check consent privacy agreements.', 'click', SELECTORS['registration.consent']),
+    # e.g. waits for the cleanup of an earlier registration of the same e-mail
+    PlanStep('REGISTRATION: Before submitting the registration.', 'hook', value='before_submit'),
+    PlanStep('REGISTRATION: Finish registration by pressing [register].', 'click', SELECTORS['registration.submit']),
+    PlanStep('REGISTRATION: Press [OK] on e-mail confirmation alert.', 'click', SELECTORS['registration.ok']),
+)
@@ -1,31 +1,61 @@
-import sys
-from playwright.sync_api import sync_playwright
-from loginUtils import nomadLogin
+'''
+Coordinates of elements that have no usable locator.
 
+    python getObjCoordinates.py <url> <browser> [anchor]    # interactive: click and read the console log
+    python getObjCoordinates.py --batch targets.json        # headless, writes reports/coordinates.json
 
-def get_coordinates(url: str, browser: str) -> None:
+A batch file lists the pages and the targets on them, every job can use its own browser:
+    [
+        {"url": "app.nomad-games.eu", "browser": "chromium", "targets": [
+            {"name": "login", "locator": "login.manual"},       # registry name(see locators.py)
+            {"name": "map", "css": "agm-map"},
+            {"name": "Vietnam", "text": "Vietnam"},
+            {"name": "apply", "role": "button", "label": "Apply"},
+            {"name": "pin", "anchor": "prague_castle_pin"}      # visual anchor(see anchors.py)
+        ]}
+    ]
+'''
+import argparse, json, os, sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from pathlib import Path
+from playwright.sync_api import sync_playwright, Page
+from anchors import FINGERPRINT_JS, record_anchor, resolve_anchor
+from locators import SELECTORS, Target, text, role, css, locators_for
+from loginUtils import HOMEPAGE, ensure_auth_state, ensure_logged_in
+from nomadConfig import get_config
+from profileStore import BROWSERS, ProfileLockedError, open_profile
+from waitUtils import network_idle, angular_stable, track_network
+
+BATCH_OUTPUT = 'reports/coordinates.json'
+TARGET_TIMEOUT = 5000  # ms a target may take to show up
+
+# JS returning where an element is: the center in viewport and page coordinates and its bounding box
+ELEMENT_COORDINATES_JS = '''(element) => {
+    const rect = element.getBoundingClientRect();
+    const x = rect.x + rect.width / 2, y = rect.y + rect.height / 2;
+    return {viewport: {x, y}, page: {x: x + window.scrollX, y: y + window.scrollY},
+            box: {x: rect.x, y: rect.y, width: rect.width, height: rect.height}};
+}'''
+
+
+def get_coordinates(url: str, browser: str, anchor: str | None = None) -> None:
     '''
     Opens a browser instance with coordinate logging functionality.
+    With an anchor name, Alt+click records the clicked element as an anchor(see anchors.py) instead of clicking it,
+    the first one is saved as <anchor>, the next ones as <anchor>_2, <anchor>_3, ...
     
     Args:
         url (str): The URL to open for codegen
         browser (str): Browser to use (chromium, firefox, webkit)
+        anchor (str): Name of the anchor to record
     '''
 
-    with sync_playwright() as p:
-        # launch browser
-        if browser == "chromium":
-            browser_instance = p.chromium.launch(headless=False)
-        elif browser == "firefox":
-            browser_instance = p.firefox.launch(headless=False)
-        elif browser == "webkit":
-            browser_instance = p.webkit.launch(headless=False)
-        else:
+    with sync_playwright() as p, ExitStack() as stack:
+        if browser not in BROWSERS:
             raise ValueError("Browser must be 'chromium', 'firefox', or 'webkit'")
         
-        # create context and page, parse script 
-        context = browser_instance.new_context()
-        page = context.new_page()
+        # parse script 
         coordinateLogger = """
             console.log('Coordinate Logger Activated!');
             console.log('Click anywhere to see coordinates...');
@@ -46,35 +76,180 @@ def get_coordinates(url: str, browser: str) -> None:
                 console.log('---');
             }, true);
         """
+        anchorRecorder = f"""
+            document.addEventListener('click', (e) => {{
+                if (!e.altKey) return;
+                e.preventDefault();
+                e.stopPropagation();
+                window.nomadRecordAnchor(e.clientX, e.clientY, ({FINGERPRINT_JS})(e.target));
+            }}, true);
+        """
+        recorded = []
+
+        def recordAnchor(source, x: float, y: float, fingerprint: dict) -> None:
+            name = anchor if not recorded else f'{anchor}_{len(recorded) + 1}'
+            record_anchor(source['page'], name, x, y, fingerprint)
+            recorded.append(name)
+            print(f'Anchor {name} recorded at ({x}, {y}): {fingerprint["selector"]}')
 
-        # navigate to URL
+        def setupPage(page: Page) -> None:
+            # add coordinate logging with JavaScript, before the page loads so it's there from the start
+            page.add_init_script(coordinateLogger)
+            if anchor:
+                page.expose_binding('nomadRecordAnchor', recordAnchor)
+                page.add_init_script(anchorRecorder)
+
+        # launch browser and navigate to URL
         try:
-            if url == 'app.nomad-games.eu':
-                nomadLogin(page)
+            if url == get_config().host:
+                # the saved profile is usually still logged in, so there's no login to wait for(see profileStore.py)
+                page = stack.enter_context(open_profile(p, browser, setupPage=setupPage))
             else:
+                browser_instance = getattr(p, browser).launch(headless=False)
+                stack.callback(browser_instance.close)
+                page = browser_instance.new_context().new_page()
+                setupPage(page)
                 page.goto('https://'+url)
+        except ProfileLockedError:
+            raise
         except:
             raise ValueError('Invalid URL!')
-            
-        # add coordinate logging with JavaScript
-        page.add_init_script(coordinateLogger)
-        page.evaluate(coordinateLogger)
         
         print(f"Browser opened at: {url}")
         print('Whenever you click, the coordinates will show up in the developer console log.')
+        if anchor:
+            print(f'Alt+click the element to record it as anchor {anchor}.')
         
         # keep browser open until user closes it
         try:
-            # wait for page to be closed by checking if context is still active
-            while not page.is_closed():
-                page.wait_for_timeout(10000)  # Check every second
+            page.wait_for_event('close', timeout=0) # no polling, returns as soon as the page is closed
         except:
             pass
         
         print("Browser closed. Coordinate logging session ended.")
 
 
+def _target(descriptor: dict) -> Target:
+    if 'locator' in descriptor:
+        return SELECTORS[descriptor['locator']]
+    if 'css' in descriptor:
+        return css(descriptor['css'], hasText=descriptor.get('hasText'), nth=descriptor.get('nth'),
+                   regex=descriptor.get('regex', False))
+    if 'text' in descriptor:
+        return text(descriptor['text'], exact=descriptor.get('exact', False), nth=descriptor.get('nth'))
+    if 'role' in descriptor:
+        return role(descriptor['role'], descriptor['label'], exact=descriptor.get('exact', False), nth=descriptor.get('nth'))
+    raise ValueError(f'Target {descriptor} needs one of locator, css, text, role or anchor')
+
+
+def _open(page: Page, url: str) -> None:
+    track_network(page) # before the navigation, requests already in flight would be missed by network_idle()
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    if url.rstrip('/').startswith(HOMEPAGE.rstrip('/')):
+        ensure_logged_in(page) # the context starts with the saved session, this only logs in if it expired
+        if url.rstrip('/') != HOMEPAGE.rstrip('/'):
+            page.goto(url)
+    else:
+        page.goto(url)
+    network_idle(page)
+    angular_stable(page)
+
+
+def _locate(page: Page, descriptor: dict) -> dict:
+    if 'anchor' in descriptor:
+        x, y = resolve_anchor(page, descriptor['anchor'])
+        scroll = page.evaluate('() => [window.scrollX, window.scrollY]')
+        return {'viewport': {'x': x, 'y': y}, 'page': {'x': x + scroll[0], 'y': y + scroll[1]}, 'box': None}
+    locator = locators_for(page).get(_target(descriptor))
+    if descriptor.get('nth') is None:
+        locator = locator.first
+    return locator.evaluate(ELEMENT_COORDINATES_JS, timeout=TARGET_TIMEOUT)
+
+
+def _capture_jobs(browser: str, jobs: list[dict], statePath: str | None) -> dict:
+    '''Runs in a worker process: one headless browser, a fresh context for every page.'''
+    results = {}
+    with sync_playwright() as p:
+        browserInstance = getattr(p, browser).launch(headless=True)
+        try:
+            for job in jobs:
+                context = browserInstance.new_context(storage_state=statePath)
+                page = context.new_page()
+                page.set_default_timeout(TARGET_TIMEOUT)
+                coordinates = results.setdefault(browser, {}).setdefault(job['url'], {})
+                try:
+                    _open(page, job['url'])
+                    for descriptor in job['targets']:
+                        try:
+                            coordinates[descriptor['name']] = _locate(page, descriptor)
+                        except Exception as E:
+                            coordinates[descriptor['name']] = {'error': str(E).splitlines()[0]}
+                except Exception as E:
+                    coordinates['error'] = str(E).splitlines()[0]
+                finally:
+                    context.close()
+        finally:
+            browserInstance.close()
+    return results
+
+
+def capture_batch(jobs: list[dict], output: str | Path = BATCH_OUTPUT, workers: int | None = None) -> dict:
+    '''
+    Resolves the coordinates of many targets without a human: headless browsers in a process pool,
+    every process takes a share of the jobs of one browser. The app's pages are opened with a saved session,
+    so only one login happens(once per browser, before the pool starts).
+    Writes {browser: {url: {target: {viewport, page, box} or {error}}}} to output and returns it.
+    '''
+    byBrowser = {}
+    for job in jobs:
+        browser = job.get('browser', 'chromium')
+        if browser not in BROWSERS:
+            raise ValueError(f"Browser must be one of {', '.join(BROWSERS)}, got {browser}")
+        byBrowser.setdefault(browser, []).append(job)
+
+    states = {}
+    appHost = get_config().host
+    with sync_playwright() as p:
+        for browser, browserJobs in byBrowser.items():
+            if any(appHost in job['url'] for job in browserJobs):
+                browserInstance = getattr(p, browser).launch(headless=True)
+                try:
+                    states[browser] = str(ensure_auth_state(browserInstance, browserName=browser))
+                finally:
+                    browserInstance.close()
+
+    workers = workers or min(os.cpu_count() or 1, len(jobs)) or 1
+    chunks = [(browser, browserJobs[i::workers], states.get(browser))
+              for browser, browserJobs in byBrowser.items() for i in range(min(workers, len(browserJobs)))]
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunkResults in executor.map(_capture_jobs, *zip(*chunks)) if chunks else ():
+            for browser, pages in chunkResults.items():
+                results.setdefault(browser, {}).update(pages)
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmpPath = output.with_suffix('.tmp')
+    tmpPath.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+    os.replace(tmpPath, output)
+    return results
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--batch':
+        parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+        parser.add_argument('--batch', required=True, metavar='TARGETS', help='json file with the pages and targets')
+        parser.add_argument('--output', default=BATCH_OUTPUT)
+        parser.add_argument('--workers', type=int, default=None, help='browser processes, defaults to the cpu count')
+        args = parser.parse_args()
+        results = capture_batch(json.loads(Path(args.batch).read_text()), args.output, args.workers)
+        failed = sum(1 for pages in results.values() for targets in pages.values()
+                     for name, coordinates in targets.items() if name == 'error' or 'error' in coordinates)
+        print(f'Coordinates saved to {args.output}' + (f', {failed} failed' if failed else ''))
+        sys.exit(1 if failed else 0)
+
     url = str(sys.argv[1])
     browser = str(sys.argv[2])
-    get_coordinates(url=url, browser=browser)
+    anchor = str(sys.argv[3]) if len(sys.argv) > 3 else None
+    get_coordinates(url=url, browser=browser, anchor=anchor)
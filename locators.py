@@ -0,0 +1,133 @@
+'''
+Registry of the app's selectors. Every selector is defined once as a Target(plain data), locators are built
+once per page and reused, regexes are compiled once per process. click()/fill() act on registry names or Targets,
+fill() doesn't click the field first - Playwright focuses it anyway, the click was a wasted round trip.
+Building a locator doesn't talk to the browser, so get() works on pages of playwright.async_api too(see asyncRunner.py).
+'''
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from weakref import WeakKeyDictionary
+from playwright.sync_api import Page, Locator
+
+
+@dataclass(frozen=True)
+class Target:
+    '''
+    What a step acts on, as data:
+    kind "text"(get_by_text), "role"(get_by_role with name) or "css"(locator), optionally filtered by its text
+    (hasText - a case-insensitive substring like Playwright's has_text, or a regex with regex=True),
+    narrowed to a css child and to its nth match.
+    '''
+    kind: str
+    value: str
+    name: str | None = None
+    exact: bool = False
+    hasText: str | None = None
+    regex: bool = False
+    child: str | None = None
+    nth: int | None = None
+
+
+def text(value: str, exact: bool = False, child: str | None = None, nth: int | None = None) -> Target:
+    return Target('text', value, exact=exact, child=child, nth=nth)
+
+
+def role(value: str, name: str, exact: bool = False, child: str | None = None, nth: int | None = None) -> Target:
+    return Target('role', value, name=name, exact=exact, child=child, nth=nth)
+
+
+def css(value: str, hasText: str | None = None, child: str | None = None, nth: int | None = None,
+        regex: bool = False) -> Target:
+    return Target('css', value, hasText=hasText, regex=regex, child=child, nth=nth)
+
+
+SELECTORS: dict[str, Target] = {
+    # login
+    'login.manual': role('button', 'Log in (manually)'),
+    'login.email': role('textbox', 'Email (username)'),
+    'login.password': role('textbox', 'Password'),
+    'login.remember': css('.mat-checkbox-inner-container'),
+    'login.submit': role('button', 'Log in'),
+    'logout': css('#sn_logout'),
+    # registration
+    'registration.link': role('link', 'Registration'),
+    'registration.email': role('textbox', 'Email (username)'),
+    'registration.username': role('textbox', 'Username', exact=True),
+    'registration.password': role('textbox', 'New password', exact=True),
+    'registration.passwordConfirmation': role('textbox', 'New password confirmation'),
+    'registration.language': role('listbox', 'Language', child='div', nth=1),
+    'registration.english': role('option', 'English', child='span'),
+    'registration.spokenLanguages': role('textbox', 'Languages that you speak'),
+    'registration.italian': css('label', hasText='Italiano'),
+    'registration.apply': role('button', 'Apply', child='span'),
+    'registration.consent': css('.mat-checkbox-inner-container', nth=0),
+    'registration.submit': text('REGISTRATION', child='span'),
+    'registration.ok': text('OK', child='span'),
+    # scenarios
+    'scenario.choose': role('button', 'Choose'),
+    'scenario.next': text('Next'),
+    'scenario.explanation': text('Explanation'),
+}
+
+
+@lru_cache(maxsize=None)
+def compiled(pattern: str) -> re.Pattern:
+    '''re.compile() once per process.'''
+    return re.compile(pattern)
+
+
+def build_locator(page: Page, target: Target) -> Locator:
+    if target.kind == 'text':
+        locator = page.get_by_text(target.value, exact=target.exact)
+    elif target.kind == 'role':
+        locator = page.get_by_role(target.value, name=target.name, exact=target.exact)
+    else:
+        locator = page.locator(target.value)
+    if target.hasText is not None:
+        locator = locator.filter(has_text=compiled(target.hasText) if target.regex else target.hasText)
+    if target.child is not None:
+        locator = locator.locator(target.child)
+    if target.nth is not None:
+        locator = locator.nth(target.nth)
+    return locator
+
+
+class PageLocators:
+    '''Locators of one page, every registry name or Target is resolved once.'''
+
+    def __init__(self, page: Page):
+        self.page = page
+        self._locators: dict[Target, Locator] = {}
+
+    def get(self, key: str | Target) -> Locator:
+        target = SELECTORS[key] if isinstance(key, str) else key
+        locator = self._locators.get(target)
+        if locator is None:
+            locator = self._locators[target] = build_locator(self.page, target)
+        return locator
+
+    def click(self, key: str | Target) -> None:
+        self.get(key).click()
+
+    def fill(self, key: str | Target, value) -> None:
+        self.get(key).fill(str(value))
+
+
+_pages: 'WeakKeyDictionary[Page, PageLocators]' = WeakKeyDictionary()
+
+def locators_for(page: Page) -> PageLocators:
+    '''The page's locator registry, created on first use and dropped with the page.'''
+    locators = _pages.get(page)
+    if locators is None:
+        locators = _pages[page] = PageLocators(page)
+    return locators
+
+
+def click(page: Page, key: str | Target) -> None:
+    locators_for(page).click(key)
+
+
+def fill(page: Page, key: str | Target, value) -> None:
+    '''Fills the field without clicking it first.'''
+    locators_for(page).fill(key, value)
@@ -0,0 +1,173 @@
+import contextvars, gzip, json, logging, os, queue
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_BUFFER_SIZE = 64 * 1024  # bytes buffered per open log file before they hit the disk
+
+# log file(or archive key) of the test running in this context
+current_test_log = contextvars.ContextVar('current_test_log', default=None)
+
+
+class TaggingQueueHandler(QueueHandler):
+    '''Puts records on the queue tagged with the running test, the test's thread never touches a file.'''
+
+    def __init__(self, logQueue: queue.Queue, pipeline: 'LogPipeline'):
+        super().__init__(logQueue)
+        self.pipeline = pipeline
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        # threads started by a test(e.g. cleanup jobs) don't inherit the context, they log to the active test
+        record.testLog = current_test_log.get() or self.pipeline.activeTest
+        return record
+
+
+class PerTestFileHandler(logging.Handler):
+    '''Runs on the listener thread, writes each record into its test's file through a large write buffer.'''
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.files = {}
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.testLog is None:
+            return
+        logFile = self.files.get(record.testLog)
+        if logFile is None:
+            logFile = open(record.testLog, 'w', buffering=LOG_BUFFER_SIZE, encoding='utf-8')
+            self.files[record.testLog] = logFile
+        logFile.write(self.format(record) + '\n')
+
+    def end_test(self, testLog: str) -> None:
+        logFile = self.files.pop(testLog, None)
+        if logFile is not None:
+            logFile.close()
+
+    def close(self) -> None:
+        for logFile in self.files.values():
+            logFile.close()
+        self.files.clear()
+        super().close()
+
+
+class WorkerArchiveHandler(logging.Handler):
+    '''
+    Runs on the listener thread, writes the records of all tests of a worker into one gzip file.
+    An index next to it maps every test to its first and last line in the uncompressed log.
+    '''
+
+    def __init__(self, archivePath: Path):
+        super().__init__(logging.DEBUG)
+        self.archivePath = archivePath
+        self.archive = gzip.open(archivePath, 'wt', encoding='utf-8')
+        self.lines = 0
+        self.index = {}
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.testLog is None:
+            return
+        self.archive.write(self.format(record) + '\n')
+        self.lines += 1
+        lines = self.index.setdefault(record.testLog, [self.lines, self.lines])
+        lines[1] = self.lines
+
+    def end_test(self, testLog: str) -> None:
+        pass
+
+    def close(self) -> None:
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+            indexPath = self.archivePath.with_name(self.archivePath.name.replace('.log.gz', '.index.json'))
+            indexPath.write_text(json.dumps(self.index, indent=2))
+        super().close()
+
+
+class _EndOfTest(logging.LogRecord):
+    '''Marker put on the queue after a test's last record, so its file can be closed.'''
+
+    def __init__(self, testLog: str):
+        super().__init__('nomad.log', logging.DEBUG, __file__, 0, '', None, None)
+        self.testLog = testLog
+
+
+class _TestQueueListener(QueueListener):
+    '''QueueListener which closes a test's files when it gets the test's end marker.'''
+
+    def handle(self, record: logging.LogRecord) -> None:
+        if isinstance(record, _EndOfTest):
+            for handler in self.handlers:
+                if hasattr(handler, 'end_test'):
+                    handler.end_test(record.testLog)
+            return
+        super().handle(record)
+
+
+def _timestamp() -> str:
+    return datetime.now().strftime('%H-%M-%S-%f')
+
+
+class LogPipeline:
+    '''
+    Logging of one xdist worker: the root logger only puts records on a queue, a listener thread
+    formats them and writes them to per-test files(or one compressed worker archive) and
+    prints ERROR and above to the console. Installed once per session instead of once per test.
+
+    Args:
+        logDir (str): directory of the log files.
+        archive (bool): write one gzip log per worker with a test index instead of a file per test.
+    '''
+
+    def __init__(self, logDir: str = 'logs', archive: bool = False):
+        self.logDir = Path(logDir)
+        self.logDir.mkdir(parents=True, exist_ok=True)
+        self.archive = archive
+        self.activeTest = None
+        self.queue = queue.SimpleQueue()
+
+        formatter = logging.Formatter(LOG_FORMAT)
+        if archive:
+            worker = os.environ.get('PYTEST_XDIST_WORKER', 'main')
+            self.fileHandler = WorkerArchiveHandler(self.logDir / f'{worker}_{_timestamp()}.log.gz')
+        else:
+            self.fileHandler = PerTestFileHandler()
+        self.fileHandler.setFormatter(formatter)
+
+        # Console handler - logs only ERROR and above
+        self.consoleHandler = logging.StreamHandler()
+        self.consoleHandler.setLevel(logging.ERROR)
+        self.consoleHandler.setFormatter(formatter)
+
+        self.queueHandler = TaggingQueueHandler(self.queue, self)
+        self.listener = _TestQueueListener(self.queue, self.fileHandler, self.consoleHandler, respect_handler_level=True)
+
+    def start(self) -> None:
+        logger = logging.getLogger()
+        logger.setLevel(logging.DEBUG)  # Logger itself accepts all levels
+        # Remove existing handlers to avoid duplicates
+        for handler in logger.handlers[:]:
+            logger.removeHandler(handler)
+        logger.addHandler(self.queueHandler)
+        self.listener.start()
+
+    def start_test(self, testName: str) -> contextvars.Token:
+        '''Routes records of this context to the test's log from now on.'''
+        # in the archive the test name is the key of the index, otherwise the path of the test's file
+        testLog = testName if self.archive else str(self.logDir / f'{testName}_{_timestamp()}.log')
+        self.activeTest = testLog
+        return current_test_log.set(testLog)
+
+    def end_test(self, token: contextvars.Token) -> None:
+        testLog = current_test_log.get()
+        current_test_log.reset(token)
+        self.activeTest = None
+        self.queue.put_nowait(_EndOfTest(testLog))
+
+    def stop(self) -> None:
+        '''Writes out everything still queued and closes the files.'''
+        logging.getLogger().removeHandler(self.queueHandler)
+        self.listener.stop()
+        self.fileHandler.close()
+        self.consoleHandler.close()
@@ -1,61 +1,152 @@
-from playwright.sync_api import sync_playwright, Page 
-import csv
+from playwright.sync_api import Page, Browser, BrowserContext
+import os, json, time, base64
 from pathlib import Path
+from typing import Callable
+from nomadConfig import get_config, load_user_credentials
+from locators import locators_for
+from flowPlans import LOGIN_PLAN
+from scenarioEngine import run_plan
+
+HOMEPAGE = get_config().homepage  # the config is read once per process, NOMAD_HOMEPAGE overrides it
+AUTH_STATE_DIR = 'user_data/auth'
+AUTH_STATE_MAX_AGE = 12 * 60 * 60  # seconds before a saved session is considered stale
+AUTH_EXPIRY_MARGIN = 5 * 60  # treat cookies/tokens expiring within this window as expired
 
 def get_user_credentials(credsDir: str) -> list:
         '''
-        Reads and returns user credentials from a csv.
+        Reads and returns user credentials from a csv, parsed only once per process(see nomadConfig.py).
         
         Args: 
             credsDir (str): the directory of your csv file that should contain credentials.
         '''
 
-        with open(credsDir, 'r') as credsFile:
-            credsReader = csv.reader(credsFile)
-            creds = list(credsReader)
-            flat_creds = [item for sublist in creds for item in sublist]
-            if len(flat_creds) >= 4:
-                return flat_creds[:4]
-            else:
-                raise ValueError("Missing credentials in CSV file")
+        return list(load_user_credentials(credsDir))
                 
 
-def nomadLogin(page: Page) -> None:
-    '''Logs in with credentials from test environment.'''
-    email, pwd, email2, pwd2 = get_user_credentials('creds.csv')
+def nomadLogin(page: Page, navigate: bool = True, credentials: tuple[str, str] | None = None) -> None:
+    '''Logs in with credentials from test environment, or with the given (email, password).
+    Pass navigate=False if the page already shows the app's landing page.'''
+    if credentials is None:
+        creds = load_user_credentials()
+        credentials = creds.email, creds.password
+    email, pwd = credentials
     try:
-        page.goto('https://app.nomad-games.eu')
-        page.get_by_role("button", name="Log in (manually)").click()
-        page.get_by_role("textbox", name="Email (username)").click()
-        page.get_by_role("textbox", name="Email (username)").fill(email)
-        page.get_by_role("textbox", name="Password").click()
-        page.get_by_role("textbox", name="Password").fill(str(pwd))
-        page.locator(".mat-checkbox-inner-container").click()
-        page.get_by_role("button", name="Log in").click()
+        if navigate:
+            page.goto(HOMEPAGE)
+        run_plan(page, LOGIN_PLAN, params={'email': email, 'password': pwd}) # the same steps as the login tests
 
     except Exception as e:
         print('LOGIN FAILED: ' + str(e))
         raise
 
-def login_and_save_profile(target_url='app.nomad-games.eu', browser='chromium') -> str:
 
-    profile_path = f"user_data/{browser}"
-    Path(profile_path).mkdir(parents=True, exist_ok=True)
+def auth_state_path(browser: str = 'chromium') -> Path:
+    '''Returns the storage state file of the current xdist worker("main" outside of xdist).'''
+    worker = os.environ.get('PYTEST_XDIST_WORKER', 'main')
+    return Path(AUTH_STATE_DIR) / f'{browser}_{worker}.json'
 
-    with sync_playwright() as p:
-        browser = getattr(p, browser).launch_persistent_context(
-            user_data_dir=profile_path,
-            headless=True
-        )
-        page = browser.new_page()
-        page.goto(target_url)
-        nomadLogin(page)
 
-        # počkej chvilku na uložení session
-        page.wait_for_timeout(2000)
-        browser.close()
+def _token_expiry(value: str) -> float | None:
+    '''Returns the "exp" claim if the value looks like a JWT, otherwise None.'''
+    parts = value.strip('"').split('.')
+    if len(parts) != 3:
+        return None
+    try:
+        payload = parts[1] + '=' * (-len(parts[1]) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get('exp')
+        return float(exp) if exp is not None else None
+    except (ValueError, AttributeError):
+        return None
+
+
+def is_auth_state_valid(statePath: str | Path, maxAge: float = AUTH_STATE_MAX_AGE) -> bool:
+    '''
+    Cheap offline check of a saved storage state - no browser involved.
+    The state is valid if it is fresh enough, holds cookies or localStorage of the app
+    and none of the app's cookies or JWT tokens expire within AUTH_EXPIRY_MARGIN.
+    '''
+    statePath = Path(statePath)
+    try:
+        if time.time() - statePath.stat().st_mtime > maxAge:
+            return False
+        state = json.loads(statePath.read_text())
+    except (OSError, ValueError):
+        return False
+
+    deadline = time.time() + AUTH_EXPIRY_MARGIN
+    appHost = HOMEPAGE.split('://', 1)[1]
+    appCookies = [cookie for cookie in state.get('cookies', []) if appHost.endswith(cookie.get('domain', '').lstrip('.'))]
+    appStorage = [item for origin in state.get('origins', []) if origin.get('origin') == HOMEPAGE
+                  for item in origin.get('localStorage', [])]
+    if not appCookies and not appStorage:
+        return False
+
+    for cookie in appCookies:
+        expires = cookie.get('expires', -1)
+        if expires != -1 and expires < deadline:
+            return False
+    for item in appStorage:
+        exp = _token_expiry(item.get('value', ''))
+        if exp is not None and exp < deadline:
+            return False
+    return True
 
-    return profile_path
 
-if __name__ == "__main__":
-    login_and_save_profile()
+def ensure_logged_in(page: Page, statePath: str | Path | None = None, credentials: tuple[str, str] | None = None) -> bool:
+    '''
+    Opens the app and logs in only if the session is gone(e.g. expired storage state).
+    When a login was needed and statePath is given, the refreshed storage state is saved there.
+    credentials (email, password) default to the test environment's account.
+    Returns True if the login form had to be used.
+    '''
+    if not page.url.startswith(HOMEPAGE):
+        page.goto(HOMEPAGE)
+    loginButton = locators_for(page).get('login.manual')
+    logoutButton = locators_for(page).get('logout')
+    loginButton.or_(logoutButton).first.wait_for(state='attached')
+    if logoutButton.count() > 0:
+        return False
+
+    nomadLogin(page, navigate=False, credentials=credentials)
+    logoutButton.wait_for(state='attached')
+    if statePath is not None:
+        save_auth_state(page, statePath)
+    return True
+
+
+def save_auth_state(page: Page, statePath: str | Path) -> None:
+    '''Saves cookies and localStorage of the page's context, atomically so readers never see half a file.'''
+    statePath = Path(statePath)
+    statePath.parent.mkdir(parents=True, exist_ok=True)
+    tmpPath = statePath.with_suffix('.tmp')
+    page.context.storage_state(path=tmpPath)
+    os.replace(tmpPath, statePath)
+
+
+def ensure_auth_state(browser: Browser, contextArgs: dict | None = None, browserName: str = 'chromium',
+                      refresh: bool = False, setupContext: Callable[[BrowserContext], None] | None = None) -> Path:
+    '''
+    Returns the path of a valid storage state for this worker, logging in once if there is none.
+    
+    Args:
+        browser (Browser): launched browser used for the login if it is needed.
+        contextArgs (dict): arguments for browser.new_context(), e.g. browser_context_args.
+        browserName (str): browser name the state file is keyed by.
+        refresh (bool): log in even if the saved state is still valid.
+        setupContext (Callable): called with the login context before it opens the app, e.g. to route it.
+    '''
+    statePath = auth_state_path(browserName)
+    if not refresh and is_auth_state_valid(statePath):
+        return statePath
+
+    context = browser.new_context(**(contextArgs or {}))
+    try:
+        if setupContext is not None:
+            setupContext(context)
+        page = context.new_page()
+        nomadLogin(page)
+        page.locator("#sn_logout").wait_for(state='attached')
+        save_auth_state(page, statePath)
+    finally:
+        context.close()
+    return statePath
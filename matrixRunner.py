@@ -0,0 +1,127 @@
+'''
+Cross-browser matrix. Runs the suite once with every browser and mode as parameters(--browser X --browser-mode Y),
+so all combinations share one xdist worker pool - a worker picks up tests of any browser, keeping each browser it
+launched warm(see contextPool.BrowserCache) - instead of one run per browser after another.
+Results and timings are aggregated per browser and mode, printed and written to reports/matrix.json.
+
+    python matrixRunner.py --browsers chromium firefox webkit --modes headless headed
+
+Headed mode needs a display(xvfb-run on CI).
+'''
+import argparse, json, os, subprocess, sys, time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from stepTimer import REPORT_DIR, STEP_REPORT, percentile, summarize
+
+BROWSERS = ('chromium', 'firefox', 'webkit')
+BROWSER_MODES = ('headless', 'headed')
+MATRIX_REPORT = 'matrix'
+MATRIX_TESTS = ['test_nomad_main.py']
+
+
+def cell_of(testName: str) -> tuple[str | None, str | None]:
+    '''(browser, mode) from the parameters of a test id, e.g. test_end2end[firefox-headless-vietnam].'''
+    if '[' not in testName:
+        return None, None
+    params = testName[testName.index('[') + 1:testName.rindex(']')].split('-')
+    browser = next((param for param in params if param in BROWSERS), None)
+    mode = next((param for param in params if param in BROWSER_MODES), None)
+    return browser, mode
+
+
+def run_matrix(tests: list[str], browsers: list[str], modes: list[str], workers: str, extra: list[str]) -> dict:
+    '''Runs pytest once over the whole matrix, returns its exit code, wall time, tests and step timings.'''
+    junitPath = Path(REPORT_DIR) / 'matrix_junit.xml'
+    command = [sys.executable, '-m', 'pytest', *tests, '-n', workers, f'--junitxml={junitPath}']
+    command += [option for browser in browsers for option in ('--browser', browser)]
+    command += [option for mode in modes for option in ('--browser-mode', mode)]
+    junitPath.unlink(missing_ok=True)
+    started = time.perf_counter()
+    result = subprocess.run(command + extra)
+    wall = (time.perf_counter() - started) * 1000
+    if not junitPath.exists():
+        raise RuntimeError(f'pytest did not run(exit code {result.returncode})')
+
+    tests = []
+    for case in ET.parse(junitPath).getroot().iter('testcase'):
+        if case.find('failure') is not None or case.find('error') is not None:
+            outcome = 'failed'
+        elif case.find('skipped') is not None:
+            outcome = 'skipped'
+        else:
+            outcome = 'passed'
+        tests.append({'name': case.get('name'), 'outcome': outcome, 'ms': float(case.get('time', 0)) * 1000})
+    try:
+        steps = json.loads((Path(REPORT_DIR) / f'{STEP_REPORT}.json').read_text())['steps']
+    except (OSError, ValueError, KeyError):
+        steps = []
+    return {'returncode': result.returncode, 'wall_ms': wall, 'tests': tests, 'steps': steps}
+
+
+def aggregate_matrix(run: dict, top: int = 5) -> dict:
+    '''Outcomes, test durations and the slowest steps of every browser/mode cell.'''
+    cells = {}
+
+    def cell(name: str) -> dict:
+        browser, mode = cell_of(name)
+        return cells.setdefault(f'{browser or "?"}/{mode or "?"}', {'passed': 0, 'failed': [], 'skipped': 0,
+                                                                     'durations': [], 'steps': []})
+
+    for test in run['tests']:
+        entry = cell(test['name'])
+        if test['outcome'] == 'failed':
+            entry['failed'].append(test['name'])
+        elif test['outcome'] == 'skipped':
+            entry['skipped'] += 1
+        else:
+            entry['passed'] += 1
+            entry['durations'].append(test['ms'])
+    for timing in run['steps']:
+        cell(timing['test'].split('::')[-1])['steps'].append(timing)
+
+    report = {}
+    for name, entry in sorted(cells.items()):
+        durations = entry['durations']
+        report[name] = {
+            'passed': entry['passed'], 'failed': entry['failed'], 'skipped': entry['skipped'],
+            'total_ms': round(sum(durations), 1),
+            'p50_ms': round(percentile(durations, 50), 1) if durations else None,
+            'p95_ms': round(percentile(durations, 95), 1) if durations else None,
+            'slowest_steps': [{key: row[key] for key in ('step', 'count', 'p50_ms', 'p95_ms')}
+                              for row in summarize(entry['steps'])[:top]],
+        }
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--browsers', nargs='+', choices=BROWSERS, default=list(BROWSERS))
+    parser.add_argument('--modes', nargs='+', choices=BROWSER_MODES, default=list(BROWSER_MODES))
+    parser.add_argument('--workers', default='auto', help='xdist workers shared by the whole matrix')
+    parser.add_argument('--top', type=int, default=5, help='slowest steps listed per cell')
+    parser.add_argument('tests', nargs='*', default=MATRIX_TESTS)
+    args, extra = parser.parse_known_args()
+
+    run = run_matrix(args.tests, args.browsers, args.modes, args.workers, extra)
+    report = aggregate_matrix(run, args.top)
+
+    print(f"\nmatrix of {len(report)} cells in {run['wall_ms'] / 1000:.1f} s")
+    for name, cell in report.items():
+        p50 = f"{cell['p50_ms']:>8.0f} ms" if cell['p50_ms'] is not None else f"{'-':>11}"
+        print(f"{name:<20} passed {cell['passed']:>3}  failed {len(cell['failed']):>3}  skipped {cell['skipped']:>3}"
+              f"  p50 {p50}  total {cell['total_ms'] / 1000:>7.1f} s")
+        for test in cell['failed']:
+            print(f'    FAILED {test}')
+
+    reportPath = Path(REPORT_DIR) / f'{MATRIX_REPORT}.json'
+    reportPath.parent.mkdir(parents=True, exist_ok=True)
+    tmpPath = reportPath.with_suffix('.tmp')
+    tmpPath.write_text(json.dumps({'wall_ms': round(run['wall_ms'], 1), 'browsers': args.browsers,
+                                   'modes': args.modes, 'cells': report}, indent=2, ensure_ascii=False))
+    os.replace(tmpPath, reportPath)
+    print(f'Matrix report saved to {reportPath}')
+    return run['returncode']
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+import hashlib, json, logging, os, re, time
+from dataclasses import dataclass, field
+from pathlib import Path
+from urllib.parse import urlsplit
+from playwright.sync_api import BrowserContext, Route, Request
+
+# headers that describe the transfer rather than the content - the cache stores decoded bodies
+HOP_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'keep-alive'}
+
+
+@dataclass(frozen=True)
+class RoutingPolicy:
+    '''
+    Decides what the browser may download during tests.
+
+    Args:
+        blockedResourceTypes (frozenset): Playwright resource types that are aborted, e.g. "media".
+        blockedUrls (tuple): regular expressions of URLs that are aborted(analytics, map tiles, ...).
+        allowedHosts (tuple): if not empty, requests to any other host are aborted. Subdomains are allowed too.
+        cachedResourceTypes (frozenset): resource types served from the on-disk cache.
+        cacheDir (str): directory of the cache shared by all xdist workers, None turns caching off.
+        cacheMaxAge (float): seconds after which a cached response is downloaded again.
+    '''
+    blockedResourceTypes: frozenset = frozenset({'media'})
+    blockedUrls: tuple = (r'google-analytics\.com', r'googletagmanager\.com', r'doubleclick\.net',
+                          r'connect\.facebook\.net', r'hotjar\.com', r'maps\.googleapis\.com/maps/vt')
+    allowedHosts: tuple = ()
+    cachedResourceTypes: frozenset = frozenset({'script', 'stylesheet', 'font', 'image'})
+    cacheDir: str | None = '.cache/static'
+    cacheMaxAge: float = 24 * 60 * 60
+    _blockedPattern: re.Pattern | None = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        pattern = re.compile('|'.join(self.blockedUrls)) if self.blockedUrls else None
+        object.__setattr__(self, '_blockedPattern', pattern)
+
+    def is_blocked(self, request: Request) -> bool:
+        if request.resource_type in self.blockedResourceTypes:
+            return True
+        if self._blockedPattern is not None and self._blockedPattern.search(request.url):
+            return True
+        if self.allowedHosts:
+            host = urlsplit(request.url).hostname or ''
+            return not any(host == allowed or host.endswith('.' + allowed) for allowed in self.allowedHosts)
+        return False
+
+    def is_cacheable(self, request: Request) -> bool:
+        return (self.cacheDir is not None and request.method == 'GET'
+                and request.resource_type in self.cachedResourceTypes
+                and request.url.startswith(('http://', 'https://')))
+
+
+class StaticCache:
+    '''
+    Content-addressed response cache on disk: bodies are stored once under their sha256,
+    small index files map a URL to status, headers and body hash.
+    Writes go through a temporary file and os.replace, so parallel xdist workers never read half a file.
+    '''
+
+    def __init__(self, cacheDir: str, maxAge: float):
+        self.objectsDir = Path(cacheDir) / 'objects'
+        self.indexDir = Path(cacheDir) / 'index'
+        self.maxAge = maxAge
+        self.objectsDir.mkdir(parents=True, exist_ok=True)
+        self.indexDir.mkdir(parents=True, exist_ok=True)
+
+    def _index_path(self, url: str) -> Path:
+        return self.indexDir / (hashlib.sha256(url.encode()).hexdigest() + '.json')
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes) -> None:
+        tmpPath = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        tmpPath.write_bytes(data)
+        os.replace(tmpPath, path)
+
+    def get(self, url: str) -> tuple[int, dict, bytes] | None:
+        indexPath = self._index_path(url)
+        try:
+            if time.time() - indexPath.stat().st_mtime > self.maxAge:
+                return None
+            entry = json.loads(indexPath.read_text())
+            body = (self.objectsDir / entry['body']).read_bytes()
+        except (OSError, ValueError, KeyError):
+            return None
+        return entry['status'], entry['headers'], body
+
+    def put(self, url: str, status: int, headers: dict, body: bytes) -> None:
+        '''Stores a response, headers are expected without HOP_HEADERS.'''
+        digest = hashlib.sha256(body).hexdigest()
+        objectPath = self.objectsDir / digest
+        if not objectPath.exists():
+            self._write_atomic(objectPath, body)
+        entry = {'url': url, 'status': status, 'headers': headers, 'body': digest}
+        self._write_atomic(self._index_path(url), json.dumps(entry).encode())
+
+
+def install_routing(context: BrowserContext, policy: RoutingPolicy) -> None:
+    '''
+    Routes every request of the context through the policy: blocked ones are aborted,
+    cacheable ones are served from or stored into the shared cache, the rest goes on unchanged.
+    Register it before route_from_har, so that recorded app traffic takes precedence.
+    '''
+    cache = StaticCache(policy.cacheDir, policy.cacheMaxAge) if policy.cacheDir else None
+
+    def handle(route: Route, request: Request) -> None:
+        if policy.is_blocked(request):
+            route.abort('blockedbyclient')
+            return
+        if cache is None or not policy.is_cacheable(request):
+            route.fallback()
+            return
+
+        cached = cache.get(request.url)
+        if cached is not None:
+            status, headers, body = cached
+            route.fulfill(status=status, headers=headers, body=body)
+            return
+
+        try:
+            response = route.fetch()
+            body = response.body()
+        except Exception as E:
+            # e.g. the page navigated away meanwhile - let the browser deal with the request itself
+            logging.debug(f'NETWORK: Could not fetch {request.url} for the cache: {E}')
+            route.fallback()
+            return
+        headers = {name: value for name, value in response.headers.items() if name.lower() not in HOP_HEADERS}
+        if response.status == 200:
+            cache.put(request.url, response.status, headers, body)
+        route.fulfill(status=response.status, headers=headers, body=body)
+
+    context.route('**/*', handle)
+
+
+def policy_from_config(config) -> RoutingPolicy:
+    '''Builds the routing policy from the net_* options in pytest.ini.'''
+    cacheDir = config.getini('net_cache_dir').strip()
+    return RoutingPolicy(
+        blockedResourceTypes=frozenset(config.getini('net_block_resource_types')),
+        blockedUrls=tuple(config.getini('net_block_urls')),
+        allowedHosts=tuple(config.getini('net_allow_hosts')),
+        cacheDir=cacheDir if cacheDir.lower() not in ('', 'off', 'none') else None,
+        cacheMaxAge=float(config.getini('net_cache_max_age')),
+    )
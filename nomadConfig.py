@@ -0,0 +1,127 @@
+import csv, os, threading
+from dataclasses import dataclass
+
+DEFAULT_HOMEPAGE = 'https://app.nomad-games.eu'
+CREDS_FILE = 'creds.csv'
+DB_CREDS_FILE = 'dbCreds.csv'
+
+
+@dataclass(frozen=True)
+class NomadConfig:
+    '''
+    Settings of the environment under test. Every field can be overridden by an environment variable,
+    so one checkout can run against several environments:
+    NOMAD_HOMEPAGE, NOMAD_CREDS_FILE and NOMAD_DB_CREDS_FILE.
+    '''
+    homepage: str = DEFAULT_HOMEPAGE
+    creds_file: str = CREDS_FILE
+    db_creds_file: str = DB_CREDS_FILE
+
+    @property
+    def host(self) -> str:
+        return self.homepage.split('://', 1)[-1].rstrip('/')
+
+
+@dataclass(frozen=True)
+class UserCredentials:
+    '''Accounts from creds.csv, overridable by NOMAD_EMAIL, NOMAD_PASSWORD, NOMAD_REG_EMAIL and NOMAD_REG_PASSWORD.'''
+    email: str
+    password: str
+    registration_email: str
+    registration_password: str
+
+    def __iter__(self):
+        # unpacks like the list get_user_credentials() used to return
+        return iter((self.email, self.password, self.registration_email, self.registration_password))
+
+
+@dataclass(frozen=True)
+class DbCredentials:
+    '''Database login from dbCreds.csv, overridable by NOMAD_DB_HOST, NOMAD_DB_USER, NOMAD_DB_PASSWORD and NOMAD_DB_NAME.'''
+    host: str
+    user: str
+    password: str
+    database: str
+
+    def __iter__(self):
+        return iter((self.host, self.user, self.password, self.database))
+
+
+USER_ENV = ('NOMAD_EMAIL', 'NOMAD_PASSWORD', 'NOMAD_REG_EMAIL', 'NOMAD_REG_PASSWORD')
+DB_ENV = ('NOMAD_DB_HOST', 'NOMAD_DB_USER', 'NOMAD_DB_PASSWORD', 'NOMAD_DB_NAME')
+
+_lock = threading.Lock()
+_csvCache: dict[str, tuple[tuple, list[str]]] = {}  # path -> ((mtime, size), fields)
+_config: NomadConfig | None = None
+
+
+def get_config() -> NomadConfig:
+    '''Returns the settings with the environment's overrides applied, read once per process(see clear_cache()).'''
+    global _config
+    with _lock:
+        if _config is None:
+            _config = NomadConfig(homepage=os.environ.get('NOMAD_HOMEPAGE', DEFAULT_HOMEPAGE),
+                                  creds_file=os.environ.get('NOMAD_CREDS_FILE', CREDS_FILE),
+                                  db_creds_file=os.environ.get('NOMAD_DB_CREDS_FILE', DB_CREDS_FILE))
+        return _config
+
+
+def _read_fields(path: str) -> list[str]:
+    '''
+    Returns all cells of the csv, row after row. The file is parsed once per process
+    and again only when its modification time or size changes.
+    '''
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        cached = _csvCache.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+    with open(path, newline='') as credsFile:
+        cells = [item for row in csv.reader(credsFile) for item in row]
+    with _lock:
+        _csvCache[path] = (signature, cells)
+    return cells
+
+
+def _load(cls, path: str, envNames: tuple[str, ...]):
+    overrides = [os.environ.get(name) for name in envNames]
+    if all(value is not None for value in overrides):
+        return cls(*overrides)  # fully configured by the environment, the file isn't needed
+    cells = _read_fields(path)
+    if len(cells) < len(envNames):
+        raise ValueError("Missing credentials in CSV file")
+    return cls(*(override if override is not None else cell for override, cell in zip(overrides, cells)))
+
+
+def load_user_credentials(path: str | None = None) -> UserCredentials:
+    '''Returns the test accounts, path defaults to the configured creds file.'''
+    return _load(UserCredentials, path or get_config().creds_file, USER_ENV)
+
+
+def load_pool_accounts(path: str | None = None) -> list[tuple[str, str]]:
+    '''
+    Returns (email, password) of the pre-created accounts listed in the creds file after the four cells of the
+    test accounts(see accountPool.py). Empty without a creds file or if it lists no more accounts.
+    '''
+    path = path or get_config().creds_file
+    if not os.path.exists(path):
+        return []
+    cells = _read_fields(path)[len(USER_ENV):]
+    if len(cells) % 2:
+        raise ValueError("Every account listed in the CSV file needs an e-mail and a password")
+    return list(zip(cells[::2], cells[1::2]))
+
+
+def load_db_credentials(path: str | None = None) -> DbCredentials:
+    '''Returns the database login, path defaults to the configured database creds file.'''
+    return _load(DbCredentials, path or get_config().db_creds_file, DB_ENV)
+
+
+def clear_cache() -> None:
+    '''Forgets the settings and all parsed files, e.g. after changing NOMAD_* variables or replacing a file
+    within the same second.'''
+    global _config
+    with _lock:
+        _config = None
+        _csvCache.clear()
@@ -0,0 +1,233 @@
+'''
+Persistent browser profiles of the tools(runCodegen.py, getObjCoordinates.py) - one per browser and account in
+user_data/profiles/<browser>/<account>. A profile is logged in once and reused: opening it checks the auth cookies
+and logs in only if they are gone. A profile that still works but is getting old is refreshed in the background
+once the tool closed it. A lock file(<profile>.lock) keeps two tools from opening the same profile, the browser
+would corrupt it.
+
+    python profileStore.py login --browser firefox     # create or repair a profile
+    python profileStore.py status
+'''
+import argparse, json, logging, os, re, subprocess, sys, time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator
+from playwright.sync_api import sync_playwright, Playwright, BrowserContext, Page
+from loginUtils import HOMEPAGE, AUTH_EXPIRY_MARGIN, ensure_logged_in
+from nomadConfig import load_user_credentials
+
+PROFILE_DIR = 'user_data/profiles'
+PROFILE_REFRESH_AGE = 6 * 60 * 60  # seconds after a login when a working profile gets refreshed in the background
+LOCK_TIMEOUT = 30  # seconds to wait for a profile another tool has open
+REFRESH_LOCK_TIMEOUT = 12 * 60 * 60  # the background refresh waits until the tool that started it is closed
+BROWSERS = ('chromium', 'firefox', 'webkit')
+
+
+class ProfileLockedError(RuntimeError):
+    '''Raised when a profile stays locked by another process.'''
+
+
+def _account(account: str | None) -> tuple[str, str]:
+    '''(email, password) of the account, the test environment's login account by default.'''
+    creds = load_user_credentials()
+    if account is None or account == creds.email:
+        return creds.email, creds.password
+    if account == creds.registration_email:
+        return creds.registration_email, creds.registration_password
+    raise ValueError(f'No password for account {account} in the test environment.')
+
+
+def profile_path(browser: str = 'chromium', account: str | None = None) -> Path:
+    if browser not in BROWSERS:
+        raise ValueError(f"Browser must be one of {', '.join(BROWSERS)}, got {browser}")
+    email = _account(account)[0]
+    return Path(PROFILE_DIR) / browser / re.sub(r'[^\w.@-]', '_', email)
+
+
+def _state_path(profile: Path) -> Path:
+    # storage state saved at the last login, its age tells when the profile needs a refresh
+    return profile.with_name(profile.name + '.state.json')
+
+
+class ProfileLock:
+    '''
+    Lock file next to the profile holding the owner's pid. A lock whose process is gone is stale and taken over,
+    so a tool that crashed doesn't block the profile.
+    '''
+
+    def __init__(self, profile: Path):
+        self.path = profile.with_name(profile.name + '.lock')
+
+    def _owner_alive(self) -> bool:
+        if os.name == 'nt':
+            return True  # os.kill() would terminate the process there, such a lock has to be removed by hand
+        try:
+            pid = int(self.path.read_text())
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except (OSError, ValueError):
+            return True  # unreadable while another process writes it, or owned by another user
+        return True
+
+    def acquire(self, timeout: float = LOCK_TIMEOUT) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._owner_alive():
+                    logging.debug(f'PROFILE: Removing stale lock {self.path}')
+                    self.path.unlink(missing_ok=True)
+                    continue
+                if time.monotonic() > deadline:
+                    raise ProfileLockedError(f'{self.path} is held by pid {self.path.read_text()}, close the other tool.')
+                time.sleep(0.2)
+                continue
+            with os.fdopen(fd, 'w') as lockFile:
+                lockFile.write(str(os.getpid()))
+            return
+
+    def release(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def has_auth_cookies(context: BrowserContext) -> bool:
+    '''Whether the profile holds app cookies that don't expire within AUTH_EXPIRY_MARGIN - no page load needed.'''
+    deadline = time.time() + AUTH_EXPIRY_MARGIN
+    cookies = context.cookies(HOMEPAGE)
+    return bool(cookies) and all(cookie.get('expires', -1) == -1 or cookie['expires'] > deadline for cookie in cookies)
+
+
+def needs_refresh(profile: Path) -> bool:
+    try:
+        return time.time() - _state_path(profile).stat().st_mtime > PROFILE_REFRESH_AGE
+    except OSError:
+        return True
+
+
+def _login(page: Page, profile: Path, credentials: tuple[str, str], url: str) -> None:
+    ensure_logged_in(page, _state_path(profile), credentials)
+    if url.rstrip('/') != HOMEPAGE.rstrip('/'):
+        page.goto(url)
+
+
+@contextmanager
+def open_profile(playwright: Playwright, browser: str = 'chromium', account: str | None = None, url: str = HOMEPAGE,
+                 headless: bool = False, setupPage: Callable[[Page], None] | None = None,
+                 lockTimeout: float = LOCK_TIMEOUT) -> Iterator[Page]:
+    '''
+    Opens the account's profile on url, logged in. The login form is only used if the auth cookies are gone.
+
+    Args:
+        setupPage (Callable): called with the page before it navigates, e.g. to add init scripts.
+        lockTimeout (float): seconds to wait if another tool has the profile open.
+    '''
+    credentials = _account(account)
+    profile = profile_path(browser, account)
+    profile.mkdir(parents=True, exist_ok=True)
+    lock = ProfileLock(profile)
+    lock.acquire(lockTimeout)
+    refresh = False
+    try:
+        context = getattr(playwright, browser).launch_persistent_context(user_data_dir=profile, headless=headless)
+        try:
+            page = context.pages[0] if context.pages else context.new_page()
+            if setupPage is not None:
+                setupPage(page)
+            if has_auth_cookies(context):
+                page.goto(url)
+                refresh = needs_refresh(profile)
+            else:
+                logging.debug(f'PROFILE: {profile} has no valid auth cookies, logging in.')
+                _login(page, profile, credentials, url)
+            yield page
+        finally:
+            context.close()
+    finally:
+        lock.release()
+    if refresh:
+        refresh_in_background(browser, account)
+
+
+def refresh_profile(browser: str = 'chromium', account: str | None = None, lockTimeout: float = LOCK_TIMEOUT,
+                    force: bool = True) -> Path:
+    '''
+    Logs the profile in again(headless). With force=False only a profile that still needs it is touched -
+    another refresh may have run while this one waited for the lock.
+    '''
+    credentials = _account(account)
+    profile = profile_path(browser, account)
+    profile.mkdir(parents=True, exist_ok=True)
+    lock = ProfileLock(profile)
+    lock.acquire(lockTimeout)
+    try:
+        with sync_playwright() as p:
+            context = getattr(p, browser).launch_persistent_context(user_data_dir=profile, headless=True)
+            try:
+                page = context.pages[0] if context.pages else context.new_page()
+                if force or needs_refresh(profile) or not has_auth_cookies(context):
+                    context.clear_cookies()
+                    _login(page, profile, credentials, HOMEPAGE)
+            finally:
+                context.close()
+    finally:
+        lock.release()
+    return profile
+
+
+def refresh_in_background(browser: str = 'chromium', account: str | None = None) -> subprocess.Popen:
+    '''Refreshes the profile in a detached process, it waits for the lock if the profile is still open.'''
+    command = [sys.executable, os.path.abspath(__file__), 'refresh', '--browser', browser, '--wait']
+    if account is not None:
+        command += ['--account', account]
+    logging.debug(f'PROFILE: Refreshing {browser} profile of {account or "the default account"} in the background.')
+    return subprocess.Popen(command, cwd=os.getcwd(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+
+
+def login_and_save_profile(target_url: str = HOMEPAGE, browser: str = 'chromium', account: str | None = None) -> str:
+    '''Makes sure the profile is logged in and returns its directory. Logs in only if the cookies are gone.'''
+    with sync_playwright() as p:
+        with open_profile(p, browser, account, url=target_url, headless=True):
+            pass
+    return str(profile_path(browser, account))
+
+
+def status() -> list[dict]:
+    rows = []
+    for profile in sorted(path for path in Path(PROFILE_DIR).glob('*/*') if path.is_dir()):
+        try:
+            age = time.time() - _state_path(profile).stat().st_mtime
+        except OSError:
+            age = None
+        rows.append({'profile': str(profile), 'age_h': None if age is None else round(age / 3600, 1),
+                     'locked': ProfileLock(profile).path.exists(), 'needs_refresh': needs_refresh(profile)})
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=('login', 'refresh', 'status'), nargs='?', default='login')
+    parser.add_argument('--browser', choices=BROWSERS, default='chromium')
+    parser.add_argument('--account', default=None, help='email, defaults to the login account of creds.csv')
+    parser.add_argument('--wait', action='store_true', help='wait for the lock as long as a tool may keep it')
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        print(json.dumps(status(), indent=2))
+    elif args.command == 'refresh':
+        if args.wait:
+            refresh_profile(args.browser, args.account, REFRESH_LOCK_TIMEOUT, force=False)
+        else:
+            refresh_profile(args.browser, args.account)
+    else:
+        print(login_and_save_profile(browser=args.browser, account=args.account))
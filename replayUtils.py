@@ -0,0 +1,63 @@
+import os, re
+from pathlib import Path
+from urllib.parse import urlsplit
+from playwright.sync_api import BrowserContext
+from loginUtils import HOMEPAGE
+
+HAR_DIR = 'hars'
+HAR_MODES = ('off', 'record', 'replay')
+
+
+def har_mode() -> str:
+    '''Returns the replay mode - "off", "record" or "replay" - from the NOMAD_HAR_MODE environment variable.
+    conftest.py sets it from the --har-mode option, so xdist workers and helper scripts see the same mode.'''
+    mode = os.environ.get('NOMAD_HAR_MODE', 'off').lower()
+    if mode not in HAR_MODES:
+        raise ValueError(f"NOMAD_HAR_MODE must be one of {', '.join(HAR_MODES)}, not '{mode}'")
+    return mode
+
+
+def is_offline() -> bool:
+    '''True when the app is served from recorded archives and the real backend(and its database) is out of reach.'''
+    return har_mode() == 'replay'
+
+
+def app_url_pattern(homepage: str | None = None) -> re.Pattern:
+    '''
+    URLs of the app and its backend - the homepage's domain(without its first label, e.g. "app.") and its subdomains.
+    Only they are recorded/replayed, third party requests(maps, fonts, ...) always go to the network.
+    '''
+    host = urlsplit(homepage or HOMEPAGE).hostname or ''
+    labels = host.split('.')
+    domain = '.'.join(labels[1:]) if len(labels) > 2 and not host.replace('.', '').isdigit() else host
+    return re.compile(rf'^https?://([a-z0-9-]+\.)*{re.escape(domain)}(:\d+)?(/|$)')
+
+
+def har_path(name: str) -> Path:
+    '''Returns the archive path for a test or flow name, e.g. "test_end2end[chromium]".'''
+    safeName = re.sub(r'[^\w.-]+', '_', name)
+    return Path(HAR_DIR) / f'{safeName}.zip'
+
+
+def apply_har(context: BrowserContext, name: str, mode: str | None = None) -> None:
+    '''
+    Records app traffic of the context into the named archive or serves it from there.
+    Has to be called before the first navigation. Recordings are written once the context is closed.
+
+    Args:
+        context (BrowserContext): context whose traffic should be recorded or replayed.
+        name (str): archive name, usually the test name.
+        mode (str): "off", "record" or "replay", defaults to har_mode().
+    '''
+    mode = mode or har_mode()
+    if mode == 'off':
+        return
+
+    path = har_path(name)
+    if mode == 'record':
+        path.parent.mkdir(parents=True, exist_ok=True)
+    elif not path.exists():
+        raise FileNotFoundError(f'No recording for {name}, run the test with --har-mode=record first: {path}')
+
+    context.route_from_har(path, url=app_url_pattern(), not_found='abort',
+                           update=mode == 'record', update_content='attach', update_mode='minimal')
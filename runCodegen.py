@@ -1,18 +1,13 @@
+import sys
 from playwright.sync_api import sync_playwright
-from loginUtils import nomadLogin
+from loginUtils import HOMEPAGE
+from profileStore import open_profile
 
-def runAuthCodegen(browser='chromium', url='https://app.nomad-games.eu'):
+def runAuthCodegen(browser='chromium', url=HOMEPAGE, account=None):
     with sync_playwright() as p:
-        browser = getattr(p, browser)
-        context = browser.launch_persistent_context(
-            user_data_dir=f"user_data/{browser}",
-            headless=False
-        )
-        page = context.new_page()
-        page.goto(url)
-        nomadLogin(page)
-        page.pause()  # opens playwright inspector
-        context.close()
+        # the saved profile of the browser and account is usually still logged in, see profileStore.py
+        with open_profile(p, browser, account, url=url, headless=False) as page:
+            page.pause()  # opens playwright inspector
 
 if __name__ == "__main__":
-    runAuthCodegen()
\ No newline at end of file
+    runAuthCodegen(*sys.argv[1:])
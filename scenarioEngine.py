@@ -0,0 +1,227 @@
+'''
+Scenario engine for quiz playthroughs. Scenarios are data(scenarios/<name>.json): how the scenario is opened,
+the answer of every question and what happens at the end. compile_scenario() turns one into a step plan - a list of
+PlanSteps that only hold data(what to do, on which Target), so the same plan can be run by any Playwright API.
+run_plan() runs it with the sync API, every locator is built once per page(see locators.py).
+
+Scenario file:
+    {
+        "name": "vietnam",
+        "label": "PLAYTHROUGH BY AREA",                       # prefix of the step names in logs and reports
+        "start": {"from": "area", "country": "Vietnam"},       # or {"from": "map", "pin": {"anchor": "...", "x": 582, "y": 292}}
+        "questions": [
+            {"answer": "1454"},
+            {"answer": "3", "nth": 0},                         # answer text isn't unique, take the first match
+            {"answer": "...", "extras": ["image", "history"]}, # look at the image / answer history between the two [Next]s
+            {"answer": "...", "nexts": 1},                     # the last question of a reviewed scenario
+            {"answer": "...", "after": ["next", "nextExact"]}  # the clicks after the explanation, in order(AFTER_STEPS)
+        ],
+        "review": {"description": "...", "positive": "good", "negative": "bad",
+                   "stars": {"Difficulty": 1, "Attraction": 2, "Relevancy": 3, "Overview": 4}},
+        "finish": "THE END"                                    # button ending a scenario without review
+    }
+'''
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from playwright.sync_api import Page
+from anchors import click_anchor
+from locators import SELECTORS, Target, text, role, css, locators_for
+from stepTimer import mark
+from waitUtils import angular_stable, element_stable
+
+SCENARIO_DIR = Path('scenarios')
+EXTRAS = ('image', 'history')
+AFTER_STEPS = ('next', 'nextExact', *EXTRAS)  # nextExact: a [Next] whose text has to match exactly
+AREA_RADIO = "#mat-radio-3 > .mat-radio-label > .mat-radio-container > .mat-radio-outer-circle"
+AREA_SELECT = "#mat-select-1 div"
+MAP = "agm-map"
+
+
+class ScenarioError(ValueError):
+    '''Raised for a scenario file that can't be compiled.'''
+
+
+@dataclass(frozen=True)
+class Question:
+    answer: str
+    nth: int | None = None
+    after: tuple[str, ...] = ('next', 'next')  # clicks after the explanation, see AFTER_STEPS
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    label: str
+    start: dict
+    questions: tuple[Question, ...]
+    review: dict | None = None
+    finish: str | None = None
+
+
+@dataclass(frozen=True)
+class PlanStep:
+    '''
+    One step of a plan. action is "goto"(value = url), "click", "fill"(value), "mouse_click"(value = (x, y)),
+    "anchor_click"(value = (anchor name, fallback (x, y)), see anchors.py), "wait_map"(Angular stable and the map not moving) or "hook"(value = name of a callback passed to run_plan()).
+    A Param value is filled in by the caller of run_plan().
+    '''
+    name: str
+    action: str
+    target: Target | None = None
+    value: object = None
+
+
+@dataclass(frozen=True)
+class Param:
+    '''A step value that differs per run, e.g. the account of a login or a namespaced review summary. The default is
+    used if the caller of run_plan() doesn't pass the param - the plan itself stays data and is shared by all tests.'''
+    name: str
+    default: object = None
+
+
+def step_value(step: PlanStep, params: dict | None = None) -> object:
+    if isinstance(step.value, Param):
+        return (params or {}).get(step.value.name, step.value.default)
+    return step.value
+
+
+def list_scenarios(scenarioDir: Path = SCENARIO_DIR) -> list[str]:
+    '''Names of all scenario files, sorted so every xdist worker collects the same order.'''
+    return sorted(path.stem for path in Path(scenarioDir).glob('*.json'))
+
+
+def _after(question: dict) -> tuple[str, ...]:
+    '''The clicks after the explanation: "after" as written, or [Next], the extras and the second [Next].'''
+    if 'after' in question:
+        return tuple(question['after'])
+    extras = tuple(question.get('extras', ()))
+    if question.get('nexts', 2) not in (1, 2):
+        raise ValueError(f"nexts must be 1 or 2, got {question['nexts']}")
+    return ('next', *extras, 'next') if question.get('nexts', 2) == 2 else ('next', *extras)
+
+
+@lru_cache(maxsize=None)
+def load_scenario(name: str, scenarioDir: Path = SCENARIO_DIR) -> Scenario:
+    '''Reads and validates scenarios/<name>.json.'''
+    path = Path(scenarioDir) / f'{name}.json'
+    try:
+        data = json.loads(path.read_text(encoding='utf-8'))
+        questions = tuple(Question(q['answer'], q.get('nth'), _after(q)) for q in data['questions'])
+        scenario = Scenario(data.get('name', name), data['label'], data['start'], questions,
+                            data.get('review'), data.get('finish'))
+    except (OSError, ValueError, KeyError, TypeError) as E:
+        raise ScenarioError(f'Invalid scenario {path}: {E!r}') from E
+
+    if scenario.start.get('from') not in ('map', 'area'):
+        raise ScenarioError(f"{path}: start.from must be 'map' or 'area'")
+    if (scenario.review is None) == (scenario.finish is None):
+        raise ScenarioError(f'{path}: a scenario ends with either a review or a finish button')
+    for question in scenario.questions:
+        if not question.after or not set(question.after) <= set(AFTER_STEPS):
+            raise ScenarioError(f'{path}: invalid question {question}')
+    return scenario
+
+
+def _start_steps(scenario: Scenario) -> list[PlanStep]:
+    label, start = scenario.label, scenario.start
+    if start['from'] == 'map':
+        pin = start['pin']
+        steps = [PlanStep(f'{label}: Wait for the map to settle.', 'wait_map'),
+                 # the pin is generated by Angular Google Maps API, it has no locator - it's found by its anchor and
+                 # the recorded coordinates are only the fallback
+                 PlanStep(f'{label}: Click scenario pin on map.', 'anchor_click',
+                          value=(pin['anchor'], (pin['x'], pin['y']))) if 'anchor' in pin else
+                 PlanStep(f'{label}: Click scenario pin on map.', 'mouse_click', value=(pin['x'], pin['y']))]
+    else:
+        steps = [PlanStep(f'{label}: Switch to selection by area.', 'click', css(AREA_RADIO)),
+                 PlanStep(f'{label}: Click arrow in the state selection form.', 'click', css(AREA_SELECT, nth=2)),
+                 PlanStep(f"{label}: Select {start['country']}.", 'click', text(start['country']))]
+    return steps + [PlanStep(f'{label}: Click [Choose] to start scenario.', 'click', SELECTORS['scenario.choose']),
+                    PlanStep(f'{label}: After intro press [Next] button.', 'click', SELECTORS['scenario.next'])]
+
+
+def _question_steps(label: str, number: int, question: Question) -> list[PlanStep]:
+    prefix = f'{label} -Q{number}'
+    steps = [PlanStep(f'{prefix}: Choose an answer.', 'click', text(question.answer, nth=question.nth)),
+             PlanStep(f'{prefix}: Check explanation.', 'click', SELECTORS['scenario.explanation'])]
+    nexts = 0
+    for after in question.after:
+        if after in ('next', 'nextExact'):
+            nexts += 1
+            nextButton = text('Next', exact=True) if after == 'nextExact' else SELECTORS['scenario.next']
+            steps.append(PlanStep(f'{prefix}: Press [Next] button {nexts}.', 'click', nextButton))
+        elif after == 'image':
+            steps += [PlanStep(f'{prefix}: Check image.', 'click', css('#img_img')),
+                      PlanStep(f'{prefix}: Go back from image.', 'click', text('Return'))]
+        elif after == 'history':
+            steps += [PlanStep(f'{prefix}: Check answer history.', 'click',
+                               css('div', hasText='^menu$', child='#detailsBtn', regex=True)),
+                      PlanStep(f'{prefix}: Check own answer.', 'click', text('search', nth=0)),
+                      PlanStep(f'{prefix}: Go back from answer history by pressing [Back].', 'click', text('Back'))]
+    return steps
+
+
+def _review_steps(label: str, review: dict) -> list[PlanStep]:
+    steps = [PlanStep(f'{label}: Finish and leave a review by clicking [REVIEW].', 'click', text('REVIEW', exact=True)),
+             # the description is also how the review is found in the database, the tester makes it unique per
+             # test(see RowTracker in cleanupUtils.py)
+             PlanStep(f'{label}: Fill review description form.', 'fill', role('textbox', 'Review description'),
+                      Param('review_description', review['description']))]
+    for key, formName in (('positive', 'Positive aspects'), ('negative', 'Negative aspects')):
+        steps.append(PlanStep(f'{label}: Fill {formName.lower()} form.', 'fill', role('textbox', formName), review[key]))
+    for i, (category, star) in enumerate(review.get('stars', {}).items(), start=1):
+        steps.append(PlanStep(f'{label}: Leave star review {i}.', 'click',
+                              css('div', hasText=f'^{category}starstarstarstarstar$', child='mat-icon', nth=star - 1,
+                                  regex=True)))
+    return steps + [PlanStep(f'{label}: Before submitting the review.', 'hook', value='before_submit'),
+                    PlanStep(f'{label}: Finish review by clicking [Apply].', 'click', role('button', 'Apply')),
+                    PlanStep(f'{label}: Finish scenario by clicking [OK]', 'click', role('button', 'OK'))]
+
+
+def compile_scenario(scenario: Scenario) -> tuple[PlanStep, ...]:
+    '''Turns a scenario into its step plan.'''
+    steps = _start_steps(scenario)
+    for number, question in enumerate(scenario.questions, start=1):
+        steps += _question_steps(scenario.label, number, question)
+    if scenario.review is not None:
+        steps += _review_steps(scenario.label, scenario.review)
+    else:
+        steps.append(PlanStep(f'{scenario.label}: Finish by pressing [{scenario.finish}]', 'click', text(scenario.finish)))
+    return tuple(steps)
+
+
+@lru_cache(maxsize=None)
+def scenario_plan(name: str) -> tuple[PlanStep, ...]:
+    '''Step plan of scenarios/<name>.json, loaded and compiled once per process.'''
+    return compile_scenario(load_scenario(name))
+
+
+def run_plan(page: Page, plan: tuple[PlanStep, ...], hooks: dict | None = None, params: dict | None = None) -> None:
+    '''Runs the plan's steps on the page, each one is a named step of the running test(see stepTimer.py).
+    params are the values of the plan's Param steps.'''
+    hooks = hooks or {}
+    locators = locators_for(page)
+    for step in plan:
+        mark(step.name)
+        if step.action == 'goto':
+            page.goto(str(step_value(step, params)))
+        elif step.action == 'click':
+            locators.click(step.target)
+        elif step.action == 'fill':
+            locators.fill(step.target, step_value(step, params))
+        elif step.action == 'mouse_click':
+            page.mouse.click(*step.value)
+        elif step.action == 'anchor_click':
+            click_anchor(page, *step.value)
+        elif step.action == 'wait_map':
+            angular_stable(page)
+            googleMap = page.locator(MAP).first
+            if googleMap.count():
+                element_stable(googleMap) # the pin's position is only right once the map stopped moving
+        elif step.action == 'hook':
+            if step.value in hooks:
+                hooks[step.value]()
+        else:
+            raise ScenarioError(f'Unknown action {step.action}')
@@ -0,0 +1,229 @@
+import csv, functools, json, logging, math, os, time
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Callable
+from playwright.sync_api import Page, Request
+
+REPORT_DIR = 'reports'
+STEP_REPORT = 'step_timings'
+
+
+@dataclass
+class StepTiming:
+    '''Timing of one named step of a flow.'''
+    test: str
+    step: str
+    wall_ms: float
+    network_busy_ms: float  # time with at least one request in flight
+    network_idle_ms: float  # wall time without any request in flight
+    requests: int  # requests started during the step
+    worker: str
+
+
+def _union_ms(intervals: list[tuple[float, float]], start: float, end: float) -> float:
+    '''Length of the union of (start, end) intervals clipped to [start, end], all in seconds. Returns ms.'''
+    clipped = sorted((max(s, start), min(e, end)) for s, e in intervals if e > start and s < end)
+    total = 0.0
+    currentStart = currentEnd = None
+    for s, e in clipped:
+        if currentEnd is None or s > currentEnd:
+            if currentEnd is not None:
+                total += currentEnd - currentStart
+            currentStart, currentEnd = s, e
+        else:
+            currentEnd = max(currentEnd, e)
+    if currentEnd is not None:
+        total += currentEnd - currentStart
+    return total * 1000
+
+
+class StepRecorder:
+    '''
+    Records wall time and network activity of named steps of one test.
+    Steps are either blocks(step()) or checkpoints(mark()) - a mark lasts until the next one.
+    onStep is called with the name of every step that starts, e.g. to apply its timeout.
+    '''
+
+    def __init__(self, test: str, onStep: Callable[[str], None] | None = None):
+        self.test = test
+        self.onStep = onStep
+        self.worker = os.environ.get('PYTEST_XDIST_WORKER', 'main')
+        self.timings: list[StepTiming] = []
+        self._inflight: dict[Request, float] = {}
+        self._finished: list[tuple[float, float]] = []
+        self._requestCount = 0
+        self._open: tuple[str, float, int] | None = None
+
+    def attach(self, page: Page) -> None:
+        '''Starts following the page's requests.'''
+        page.on('request', self._on_request)
+        page.on('requestfinished', self._on_request_done)
+        page.on('requestfailed', self._on_request_done)
+
+    def _on_request(self, request: Request) -> None:
+        self._requestCount += 1
+        self._inflight[request] = time.time()
+
+    def _on_request_done(self, request: Request) -> None:
+        seen = self._inflight.pop(request, None)
+        if seen is None:
+            return
+        start, end = seen, time.time()
+        timing = request.timing
+        # the browser's own timestamps are more precise than the moment Python got the event
+        if timing.get('startTime', -1) > 0:
+            start = timing['startTime'] / 1000
+            if timing.get('responseEnd', -1) >= 0:
+                end = start + timing['responseEnd'] / 1000
+        self._finished.append((start, end))
+
+    def _record(self, name: str, start: float, requestsBefore: int) -> None:
+        end = time.time()
+        intervals = self._finished + [(seen, end) for seen in self._inflight.values()]
+        busy = _union_ms(intervals, start, end)
+        wall = (end - start) * 1000
+        self.timings.append(StepTiming(self.test, name, round(wall, 1), round(busy, 1), round(max(wall - busy, 0), 1),
+                                       self._requestCount - requestsBefore, self.worker))
+        # requests which ended before this step can't overlap any later step
+        self._finished = [(s, e) for s, e in self._finished if e > start]
+
+    def mark(self, name: str) -> None:
+        '''Ends the current checkpoint step and starts a new one, logging its name like the flows always did.'''
+        self.finish()
+        logging.debug(name)
+        if self.onStep is not None:
+            self.onStep(name)
+        self._open = (name, time.time(), self._requestCount)
+
+    @contextmanager
+    def step(self, name: str):
+        '''Times the enclosed block as one step.'''
+        self.finish()
+        logging.debug(name)
+        if self.onStep is not None:
+            self.onStep(name)
+        start, requestsBefore = time.time(), self._requestCount
+        try:
+            yield
+        finally:
+            self._record(name, start, requestsBefore)
+
+    def finish(self) -> None:
+        '''Ends the current checkpoint step, if there is one.'''
+        if self._open is not None:
+            name, start, requestsBefore = self._open
+            self._open = None
+            self._record(name, start, requestsBefore)
+
+
+_current: StepRecorder | None = None
+
+def set_recorder(recorder: StepRecorder | None) -> None:
+    '''Makes the recorder the target of mark() and step(), conftest.py sets one for every test.'''
+    global _current
+    _current = recorder
+
+
+def mark(name: str) -> None:
+    '''Starts a new named step of the running test. Without a recorder it only logs the name.'''
+    if _current is None:
+        logging.debug(name)
+    else:
+        _current.mark(name)
+
+
+@contextmanager
+def step(name: str):
+    '''Times the enclosed block as a named step of the running test.'''
+    if _current is None:
+        logging.debug(name)
+        yield
+    else:
+        with _current.step(name):
+            yield
+
+
+def timed_flow(flow):
+    '''Decorator for flows built from mark() calls - closes the last step when the flow returns or fails.'''
+    @functools.wraps(flow)
+    def wrapper(*args, **kwargs):
+        try:
+            return flow(*args, **kwargs)
+        finally:
+            if _current is not None:
+                _current.finish()
+    return wrapper
+
+
+def write_worker_report(timings: list[StepTiming], reportDir: str = REPORT_DIR) -> Path:
+    '''Saves the timings of this xdist worker, the controller merges them at the end of the session.'''
+    worker = os.environ.get('PYTEST_XDIST_WORKER', 'main')
+    path = Path(reportDir) / f'{STEP_REPORT}_{worker}.json'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps([asdict(timing) for timing in timings]))
+    return path
+
+
+def clear_worker_reports(reportDir: str = REPORT_DIR) -> None:
+    '''Removes worker reports of previous runs, so they don't get merged into this one.'''
+    for path in Path(reportDir).glob(f'{STEP_REPORT}_*.json'):
+        path.unlink(missing_ok=True)
+
+
+def percentile(values: list[float], percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize(timings: list[dict]) -> list[dict]:
+    '''Aggregates timings by step name, slowest(by p95) first.'''
+    byStep = {}
+    for timing in timings:
+        byStep.setdefault(timing['step'], []).append(timing)
+    summary = []
+    for name, stepTimings in byStep.items():
+        walls = [timing['wall_ms'] for timing in stepTimings]
+        summary.append({
+            'step': name,
+            'count': len(walls),
+            'mean_ms': round(sum(walls) / len(walls), 1),
+            'p50_ms': percentile(walls, 50),
+            'p95_ms': percentile(walls, 95),
+            'max_ms': max(walls),
+            'network_busy_ms': round(sum(timing['network_busy_ms'] for timing in stepTimings) / len(walls), 1),
+        })
+    return sorted(summary, key=lambda row: row['p95_ms'], reverse=True)
+
+
+def merge_reports(reportDir: str = REPORT_DIR) -> dict | None:
+    '''
+    Merges the worker reports into reports/step_timings.json(steps, per test totals, per step summary)
+    and reports/step_timings.csv(one row per step) and removes the worker reports.
+    Returns None if no worker recorded anything.
+    '''
+    timings = []
+    workerReports = sorted(Path(reportDir).glob(f'{STEP_REPORT}_*.json'))
+    if not workerReports:
+        return None
+    for path in workerReports:
+        timings.extend(json.loads(path.read_text()))
+
+    tests = {}
+    for timing in timings:
+        totals = tests.setdefault(timing['test'], {'wall_ms': 0.0, 'network_busy_ms': 0.0, 'steps': 0})
+        totals['wall_ms'] = round(totals['wall_ms'] + timing['wall_ms'], 1)
+        totals['network_busy_ms'] = round(totals['network_busy_ms'] + timing['network_busy_ms'], 1)
+        totals['steps'] += 1
+
+    report = {'steps': timings, 'tests': tests, 'summary': summarize(timings)}
+    Path(reportDir).mkdir(parents=True, exist_ok=True)
+    Path(reportDir, f'{STEP_REPORT}.json').write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    with open(Path(reportDir, f'{STEP_REPORT}.csv'), 'w', newline='', encoding='utf-8') as csvFile:
+        writer = csv.DictWriter(csvFile, fieldnames=list(StepTiming.__dataclass_fields__))
+        writer.writeheader()
+        writer.writerows(timings)
+
+    for path in workerReports:
+        path.unlink(missing_ok=True)
+    return report
@@ -0,0 +1,22 @@
+import pytest
+from accountPool import AccountPool, AccountPoolError
+from nomadConfig import UserCredentials
+
+BASE = UserCredentials('tester@nomad.cz', 'pass', 'tester.reg@nomad.cz', 'regPass')
+
+
+def test_lease_skips_leased_accounts(tmp_path) -> None:
+    pool = AccountPool(BASE, [('a@nomad.cz', 'a'), ('b@nomad.cz', 'b')], 'ns', str(tmp_path))
+    with pool.lease() as first, pool.lease() as second:
+        assert {first.email, second.email} == {'a@nomad.cz', 'b@nomad.cz'}
+        with pytest.raises(AccountPoolError):
+            with pool.lease(timeout=0):
+                pass
+    with pool.lease() as again:
+        assert pool.credentials(again) == UserCredentials('a@nomad.cz', 'a', BASE.registration_email, 'regPass')
+
+def test_registration_emails_are_new(tmp_path) -> None:
+    pool = AccountPool(BASE, [], 'ns', str(tmp_path))
+    emails = [pool.registration_credentials().registration_email for _ in range(2)]
+    assert emails == ['tester.reg+reg.ns.1@nomad.cz', 'tester.reg+reg.ns.2@nomad.cz']
+    assert pool.registrations == emails
@@ -0,0 +1,14 @@
+import numpy as np
+from anchors import match_template
+
+
+def test_match_template_finds_the_cut_out() -> None:
+    image = np.random.default_rng(7).random((60, 80))
+    x, y, score = match_template(image, image[21:37, 45:61])
+    assert (x, y) == (45, 21)
+    assert score > 0.99
+
+def test_match_template_rejects_flat_and_oversized_templates() -> None:
+    image = np.random.default_rng(7).random((20, 20))
+    assert match_template(image, np.ones((8, 8)))[2] == -1.0
+    assert match_template(image, np.zeros((30, 10)))[2] == -1.0
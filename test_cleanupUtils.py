@@ -0,0 +1,51 @@
+import os, pytest
+import cleanupUtils
+from cleanupUtils import CleanupPlan, OwnedRows
+
+
+def test_statements_by_condition() -> None:
+    plan = CleanupPlan('tenant', 'email = %s', ('a@b.cz',), dependents=(OwnedRows('tenant_language', 'tenant'),))
+    assert plan.statements() == [
+        ('tenant_language', 'DELETE FROM tenant_language WHERE tenant IN (SELECT id FROM tenant WHERE email = %s)', ('a@b.cz',)),
+        ('tenant', 'DELETE FROM tenant WHERE email = %s', ('a@b.cz',)),
+    ]
+
+def test_statements_by_ids_in_chunks(monkeypatch) -> None:
+    monkeypatch.setattr(cleanupUtils, 'CLEANUP_CHUNK_SIZE', 2)
+    plan = CleanupPlan('review', dependents=(OwnedRows('review_score', 'review'),), ids=(1, 2, 3))
+    assert plan.statements() == [
+        ('review_score', 'DELETE FROM review_score WHERE review IN (%s, %s)', (1, 2)),
+        ('review', 'DELETE FROM review WHERE id IN (%s, %s)', (1, 2)),
+        ('review_score', 'DELETE FROM review_score WHERE review IN (%s)', (3,)),
+        ('review', 'DELETE FROM review WHERE id IN (%s)', (3,)),
+    ]
+
+def test_merge_plans_joins_ids_of_a_table() -> None:
+    language = (OwnedRows('tenant_language', 'tenant'),)
+    byEmail = CleanupPlan('tenant', 'email = %s', ('a@b.cz',), language)
+    merged = cleanupUtils.merge_plans([CleanupPlan('tenant', dependents=language, ids=(1, 2)), byEmail,
+                                       CleanupPlan('review', ids=(7,)),
+                                       CleanupPlan('tenant', dependents=language, ids=(2, 3))])
+    assert merged == [CleanupPlan('tenant', dependents=language, ids=(1, 2, 3)), CleanupPlan('review', ids=(7,)), byEmail]
+
+def test_plan_json_round_trip() -> None:
+    for plan in (CleanupPlan('review', 'summary = %s', ('x [run-gw0]',), (OwnedRows('review_score', 'review'),)),
+                 CleanupPlan('tenant', dependents=(OwnedRows('tenant_language', 'tenant'),), key='tenant_id', ids=(4, 5))):
+        assert cleanupUtils._plan_from_json(cleanupUtils._plan_to_json(plan)) == plan
+
+def test_sweep_skips_ledgers_of_live_processes(tmp_path, monkeypatch) -> None:
+    tracker = cleanupUtils.RowTracker('run-gw0', ledgerDir=str(tmp_path))
+    tracker.track('review', [1, 2])
+    monkeypatch.setattr(cleanupUtils, 'run_cleanup', lambda *plans: pytest.fail('the ledger of this process was swept'))
+    assert cleanupUtils.sweep_ledgers(str(tmp_path)) == {}
+    assert tracker.ledger.exists()
+
+@pytest.mark.skipif(os.name == 'nt', reason='Windows sweeps ledgers by their age')
+def test_sweep_deletes_rows_of_dead_processes(tmp_path, monkeypatch) -> None:
+    tracker = cleanupUtils.RowTracker('run-gw0', ledgerDir=str(tmp_path))
+    tracker.track('review', [1, 2])
+    tracker.track('review', [3])
+    monkeypatch.setattr(cleanupUtils, '_pid_alive', lambda pid: False)
+    monkeypatch.setattr(cleanupUtils, 'run_cleanup', lambda *plans: {'review': sum(len(plan.ids) for plan in plans)})
+    assert cleanupUtils.sweep_ledgers(str(tmp_path)) == {'review': 3}
+    assert not tracker.ledger.exists()
@@ -0,0 +1,7 @@
+from matrixRunner import cell_of
+
+
+def test_cell_of_reads_browser_and_mode() -> None:
+    assert cell_of('test_end2end[firefox-headless-vietnam]') == ('firefox', 'headless')
+    assert cell_of('test_manualLogin[webkit]') == ('webkit', None)
+    assert cell_of('test_manualLogin') == (None, None)
@@ -1,20 +1,20 @@
-from nomadTests import NomadEnd2EndTest, NomadTestEnv, NomadAuthTest
-from mysql.connector import MySQLConnection
-from mysql.connector.cursor import MySQLCursor
+from nomadTests import NomadEnd2EndTest, NomadAuthTest
+from scenarioEngine import list_scenarios
 from playwright.sync_api import Page
 import pytest
 
 @pytest.mark.order(1)
-def test_manualLogin(page: Page, browser_name: str) -> None:
-    tester = NomadAuthTest()
-    tester.manualLogin(page=page)
+def test_manualLogin(page: Page, browser_name: str, test_credentials) -> None:
+    with NomadAuthTest(test_credentials) as tester:
+        tester.manualLogin(page=page)
     
 @pytest.mark.order(2)
-def test_registration(page: Page, browser_name: str) -> None:
-    tester = NomadAuthTest()
-    tester.registration(page=page)
+def test_registration(page: Page, browser_name: str, registration_credentials) -> None:
+    with NomadAuthTest(registration_credentials) as tester:
+        tester.registration(page=page)
 
 @pytest.mark.order(3)
-def test_end2end(page: Page, browser_name: str) -> None:
-    tester = NomadEnd2EndTest()
-    tester.playthroughFromMap(page=page)
+@pytest.mark.parametrize("scenario", list_scenarios()) # xdist spreads the scenarios over the workers
+def test_end2end(auth_page: Page, browser_name: str, scenario: str, row_tracker) -> None:
+    with NomadEnd2EndTest(tracker=row_tracker) as tester:
+        tester.playScenario(page=auth_page, name=scenario)
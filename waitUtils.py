@@ -0,0 +1,188 @@
+import json, os, re, time
+from pathlib import Path
+from weakref import WeakKeyDictionary
+from playwright.sync_api import Page, Locator, Request, TimeoutError as PlaywrightTimeoutError
+from stepTimer import REPORT_DIR, summarize
+
+DEFAULT_TIMEOUT = 15000  # ms, actions of steps without any history
+NAVIGATION_TIMEOUT = 10000  # ms
+NETWORK_IDLE_MS = 500  # quiet time network_idle() waits for by default
+TIMEOUT_FACTOR = 3  # a step may take this many times its historical p95 before it times out
+MIN_STEP_TIMEOUT = 3000  # ms, so a step that used to be instant still has room for a slow response
+MAX_STEP_TIMEOUT = 30000  # ms
+HISTORY_WEIGHT = 0.3  # weight of the newest run in the step history
+HISTORY_FILE = 'step_history_{mode}.json'  # replayed steps are much faster than live ones, so each mode has its own
+
+_stepTimeout: int | None = None  # timeout of the running step, default of the predicates below
+
+
+def current_timeout() -> int:
+    '''Timeout(ms) of the running step, DEFAULT_TIMEOUT outside of steps.'''
+    return _stepTimeout or DEFAULT_TIMEOUT
+
+
+class NetworkTracker:
+    '''Follows the page's requests, so network_idle() knows what is in flight and when the last one ended.'''
+
+    def __init__(self, page: Page):
+        self.inflight: set[Request] = set()
+        self.lastActivity = time.monotonic()
+        page.on('request', self._on_request)
+        page.on('requestfinished', self._on_done)
+        page.on('requestfailed', self._on_done)
+
+    def _on_request(self, request: Request) -> None:
+        self.inflight.add(request)
+        self.lastActivity = time.monotonic()
+
+    def _on_done(self, request: Request) -> None:
+        self.inflight.discard(request)
+        self.lastActivity = time.monotonic()
+
+    def quiet_ms(self, ignore: re.Pattern | None = None) -> float:
+        '''How long no request(other than ignored ones) has been in flight.'''
+        if any(ignore is None or not ignore.search(request.url) for request in self.inflight):
+            return 0.0
+        return (time.monotonic() - self.lastActivity) * 1000
+
+
+_trackers: 'WeakKeyDictionary[Page, NetworkTracker]' = WeakKeyDictionary()
+
+def track_network(page: Page) -> NetworkTracker:
+    '''Starts following the page's requests, conftest.py does it when a test gets its page.
+    Requests that started before aren't known to network_idle().'''
+    if page not in _trackers:
+        _trackers[page] = NetworkTracker(page)
+    return _trackers[page]
+
+
+def network_idle(page: Page, idle_ms: int = NETWORK_IDLE_MS, timeout: int | None = None,
+                 ignore: str | None = None) -> None:
+    '''
+    Waits until no request has been in flight for idle_ms - unlike wait_for_load_state('networkidle')
+    it works after the page loaded(XHRs started by a click) and the quiet time is configurable.
+
+    Args:
+        idle_ms (int): quiet time in ms.
+        timeout (int): ms, defaults to the step's timeout.
+        ignore (str): regular expression of URLs that don't count, e.g. long polling.
+    '''
+    tracker = track_network(page)
+    timeout = timeout or current_timeout()
+    ignored = re.compile(ignore) if ignore else None
+    deadline = time.monotonic() + timeout / 1000
+    while True:
+        quiet = tracker.quiet_ms(ignored)
+        if quiet >= idle_ms:
+            return
+        remaining = (deadline - time.monotonic()) * 1000
+        if remaining <= 0:
+            pending = ', '.join(sorted(request.url for request in tracker.inflight)[:5])
+            raise PlaywrightTimeoutError(f'Network not idle for {idle_ms} ms within {timeout} ms. In flight: {pending}')
+        # waiting on the page(not time.sleep) lets playwright deliver the request events meanwhile
+        page.wait_for_timeout(max(min(idle_ms - quiet, remaining, 100), 1))
+
+
+ANGULAR_STABLE_JS = '''() => new Promise(resolve => {
+    const testabilities = window.getAllAngularTestabilities ? window.getAllAngularTestabilities() : [];
+    if (!testabilities.length) return resolve(true);  // not an Angular page(yet)
+    let pending = testabilities.length;
+    testabilities.forEach(testability => testability.whenStable(() => --pending || resolve(true)));
+})'''
+
+
+def angular_stable(page: Page, timeout: int | None = None) -> None:
+    '''Waits until Angular has no pending macrotasks(HTTP calls, timers) and finished change detection.'''
+    page.wait_for_function(ANGULAR_STABLE_JS, timeout=timeout or current_timeout())
+
+
+ELEMENT_STABLE_JS = '''([element, frames, timeout]) => new Promise((resolve, reject) => {
+    const deadline = performance.now() + timeout;
+    let last = null, stableFrames = 0;
+    const check = () => {
+        const rect = element.getBoundingClientRect();
+        const box = [rect.x, rect.y, rect.width, rect.height].join();
+        stableFrames = box === last ? stableFrames + 1 : 0;
+        last = box;
+        if (stableFrames >= frames) return resolve(rect.toJSON());
+        if (performance.now() > deadline) return reject(new Error(`Element kept moving for ${timeout} ms`));
+        requestAnimationFrame(check);
+    };
+    requestAnimationFrame(check);
+})'''
+
+
+def element_stable(locator: Locator, frames: int = 2, timeout: int | None = None) -> dict:
+    '''
+    Waits until the element is visible and its bounding box stays the same for a number of animation frames,
+    e.g. before clicking coordinates inside a map that is still zooming. Returns the box.
+    '''
+    timeout = timeout or current_timeout()
+    started = time.monotonic()
+    locator.wait_for(state='visible', timeout=timeout)
+    remaining = max(timeout - (time.monotonic() - started) * 1000, 1)
+    handle = locator.element_handle(timeout=remaining)
+    try:
+        return locator.page.evaluate(ELEMENT_STABLE_JS, [handle, frames, remaining])
+    finally:
+        handle.dispose()
+
+
+class StepTimeouts:
+    '''
+    Per step action timeouts learned from how long the steps took in previous runs(see stepTimer.py):
+    TIMEOUT_FACTOR times the step's p95, between MIN_STEP_TIMEOUT and MAX_STEP_TIMEOUT.
+    A step that usually takes a second then fails after a few seconds instead of the blanket timeout,
+    steps without history keep the default.
+    '''
+
+    def __init__(self, history: dict[str, float] | None = None, default: int = DEFAULT_TIMEOUT):
+        self.history = history or {}
+        self.default = default
+
+    @classmethod
+    def load(cls, mode: str = 'off', reportDir: str = REPORT_DIR) -> 'StepTimeouts':
+        try:
+            history = json.loads((Path(reportDir) / HISTORY_FILE.format(mode=mode)).read_text())
+        except (OSError, ValueError):
+            history = {}
+        return cls(history)
+
+    def for_step(self, step: str) -> int:
+        p95 = self.history.get(step)
+        if p95 is None:
+            return self.default
+        return int(min(max(p95 * TIMEOUT_FACTOR, MIN_STEP_TIMEOUT), MAX_STEP_TIMEOUT))
+
+    def apply(self, pages: list[Page], step: str) -> None:
+        '''Sets the step's timeout as the default of the pages' actions and of the predicates above.'''
+        global _stepTimeout
+        _stepTimeout = self.for_step(step)
+        for page in pages:
+            page.set_default_timeout(_stepTimeout)
+
+
+def reset_step_timeout() -> None:
+    '''Back to DEFAULT_TIMEOUT, called when a test ends.'''
+    global _stepTimeout
+    _stepTimeout = None
+
+
+def update_step_history(timings: list[dict], mode: str = 'off', reportDir: str = REPORT_DIR) -> None:
+    '''Merges the p95 of this run's steps into the history as a moving average. Pass only timings of passed tests,
+    a failed step took as long as its timeout.'''
+    if not timings:
+        return
+    path = Path(reportDir) / HISTORY_FILE.format(mode=mode)
+    try:
+        history = json.loads(path.read_text())
+    except (OSError, ValueError):
+        history = {}
+    for row in summarize(timings):
+        previous = history.get(row['step'])
+        p95 = row['p95_ms']
+        history[row['step']] = round(p95 if previous is None else HISTORY_WEIGHT * p95 + (1 - HISTORY_WEIGHT) * previous, 1)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmpPath = path.with_suffix('.tmp')
+    tmpPath.write_text(json.dumps(history, indent=2, ensure_ascii=False))
+    os.replace(tmpPath, path)